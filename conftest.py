@@ -1,21 +1,35 @@
 import pytest
+import socket
 import subprocess
 import time
 import os
 import sys
 
+# The port ftp_server.py listens on
+SERVER_PORT = 2121
+# How long to wait for the FTP server to start accepting connections
+SERVER_STARTUP_TIMEOUT = 10.0
+
+def _server_ready() -> bool:
+    with socket.socket() as probe:
+        return probe.connect_ex(("127.0.0.1", SERVER_PORT)) == 0
+
 @pytest.fixture(scope="session", autouse=True)
 def ftp_server():
     # Start the FTP server in a separate process
     server_path = os.path.join(os.path.dirname(__file__), "ftp_server.py")
     process = subprocess.Popen([sys.executable, server_path])
-    
-    # Give the server some time to start up
-    time.sleep(2)
-    
+
+    # Wait until the server accepts connections, instead of sleeping a fixed amount of time
+    deadline = time.monotonic() + SERVER_STARTUP_TIMEOUT
+    while not _server_ready():
+        if process.poll() is not None or time.monotonic() > deadline:
+            process.kill()
+            pytest.exit("The FTP server failed to start.")
+        time.sleep(0.005)
+
     yield
-    
+
     # Terminate the FTP server process after tests are done
     process.terminate()
     process.wait()
-
@@ -1,14 +1,43 @@
-import io
-import re
-import uuid
-from ftplib import FTP, error_perm
-from pathlib import Path
-from typing import List, Optional, Dict, Any, Union
+import itertools
+import os
+import posixpath
+import secrets
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from ftplib import FTP, error_perm, error_reply, error_temp
+from typing import BinaryIO, Iterator, List, Optional, Dict, Any, Tuple, Union
+
+from pydantic import SecretStr
+
 from ftp_logger import logger
 
 
-# Dictionary of active FTP sessions
-ftp_sessions: Dict[str, FTP] = {}
+# Number of parallel file transfers in recursive operations (each copy uses two connections)
+POOL_SIZE = 4
+# Size of the blocks read from a data connection when streaming a file, tunable with FTP_BUFFER_SIZE
+BLOCK_SIZE = int(os.environ.get("FTP_BUFFER_SIZE", 65536))
+# Seconds a session may go unused before keep_sessions_alive sends it a NOOP, so the server doesn't time it out
+KEEPALIVE_INTERVAL = 60.0
+# Seconds a pooled connection may sit idle before it is probed with NOOP on checkout
+POOL_IDLE_PROBE = 30.0
+# Maximum number of commands sent before reading their replies when pipelining
+PIPELINE_BATCH_SIZE = 32
+# Maximum number of open sessions, the least recently used one is closed to make room for a new one
+MAX_SESSIONS = 256
+# Seconds a session may go unused before expire_idle_sessions closes it
+SESSION_IDLE_TIMEOUT = 900.0
+# Seconds a directory listing is served from the session's cache, as long as no session of the same user
+# changed anything on the server
+LISTING_CACHE_TTL = 5.0
+# Maximum number of disconnected sessions whose logged-in connections are kept for reuse by ftp_connect
+MAX_WARM_SESSIONS = 8
+# Seconds a disconnected session's connections are kept for reuse, well below the usual server idle timeouts
+WARM_SESSION_TTL = 60.0
 
 
 class ToolError(Exception):
@@ -16,108 +45,607 @@ class ToolError(Exception):
     pass
 
 
-def _check_session(session_id: str) -> FTP:
+class SessionFTP(FTP):
+    """
+    An FTP connection tuned for many small commands on the control connection and bulk transfers on the
+    data connections, which keeps track of the transfer type last requested from the server,
+    so the type is only changed when an operation actually needs a different one.
+    It also caches the working directory, so PWD is only sent after a command that may have changed it,
+    and recent directory listings, which are dropped as soon as a command sent by any connection of the same user
+    to the same server may have changed the file system.
+    """
+    # RFC 959: the default transfer type after login is ASCII
+    transfer_type = "A"
+    # The working directory last reported by PWD, None when unknown
+    current_dir: Optional[str] = None
+    # Commands which may change the working directory
+    DIRECTORY_COMMANDS = frozenset(("CWD", "XCWD", "CDUP", "XCUP", "USER", "REIN"))
+    # Commands which can't change the file system, any other command invalidates the cached listings
+    READ_ONLY_COMMANDS = frozenset(("NOOP", "PWD", "XPWD", "CWD", "XCWD", "CDUP", "XCUP", "TYPE", "MODE", "STRU",
+                                    "PASV", "EPSV", "PORT", "EPRT", "REST", "LIST", "NLST", "MLSD", "MLST", "SIZE",
+                                    "MDTM", "RETR", "SYST", "FEAT", "HELP", "STAT", "OPTS", "ABOR"))
+    # Set once the control connection failed at the socket level, after which it can't be used anymore
+    broken = False
+    # The working directory right after login, where a reused connection is moved back to
+    home_dir: Optional[str] = None
+    # The user logged in on the connection, None before login
+    user: Optional[str] = None
+    # Set once a raw command was sent, which may have left server state behind (e.g. REST, RNFR or MODE)
+    raw_commands_sent = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (time.monotonic() of the listing, listing generation it was made in, listing)
+        # by (list method, working directory, listed directory, facts)
+        self.listings: Dict[Tuple[str, str, str, Optional[Tuple[str, ...]]], Tuple[float, int, list]] = {}
+        # The MLST facts the server sends by default, as announced by FEAT. None until asked for
+        self.default_facts: Optional[Tuple[str, ...]] = None
+
+    def connect(self, *args, **kwargs) -> str:
+        welcome = super().connect(*args, **kwargs)
+        # Commands are tiny, send them right away instead of letting Nagle's algorithm hold them back
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Let the OS detect a dead peer on an idle session
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        return welcome
+
+    def login(self, user: str = "", passwd: str = "", acct: str = "") -> str:
+        response = super().login(user, passwd, acct)
+        self.user = user
+        return response
+
+    @property
+    def listing_generation(self) -> int:
+        """The current listing generation of the user on the server, a cached listing from another one is stale."""
+        return _listing_generations.get((self.host, self.port, self.user), 0)
+
+    def invalidate_listings(self) -> None:
+        """
+        Drops the cached listings of every connection of the same user to the same server,
+        after a command which may have changed the file system.
+        """
+        self.listings.clear()
+        _listing_generations[(self.host, self.port, self.user)] = next(_generation_counter)
+
+    def putcmd(self, line: str) -> None:
+        # Catches both our own TYPE commands and the ones ftplib sends for transfers
+        if line[:5].upper() == "TYPE ":
+            self.transfer_type = line[5:].strip().upper()
+        # Catches raw commands sent through ftp_send_command as well
+        command = line.split(" ", 1)[0].upper()
+        if command in self.DIRECTORY_COMMANDS:
+            self.current_dir = None
+        if command not in self.READ_ONLY_COMMANDS:
+            self.invalidate_listings()
+        super().putcmd(line)
+
+    def putline(self, line: str) -> None:
+        try:
+            super().putline(line)
+        except OSError:
+            self.broken = True
+            raise
+
+    def getresp(self) -> str:
+        try:
+            return super().getresp()
+        except error_temp as e:
+            # 421: the server is shutting the control connection down
+            if str(e).startswith("421"):
+                self.broken = True
+            raise
+
+    def getline(self) -> str:
+        try:
+            return super().getline()
+        except (EOFError, OSError):
+            # EOFError: the server closed the connection, OSError: reset or timed out mid-reply
+            self.broken = True
+            raise
+
+    def pwd(self) -> str:
+        if self.current_dir is None:
+            self.current_dir = super().pwd()
+        return self.current_dir
+
+    def set_transfer_type(self, transfer_type: str) -> None:
+        """
+        Sends a TYPE command, unless the server is already using the given transfer type.
+
+        :param transfer_type: 'A' for ASCII, 'I' for binary.
+        """
+        if self.transfer_type != transfer_type:
+            self.voidcmd(f"TYPE {transfer_type}")
+
+    def _default_mlst_facts(self) -> Tuple[str, ...]:
+        """
+        Reads the facts the server sends by default (marked with '*' on the MLST line of FEAT, RFC 3659),
+        only asking the server the first time.
+
+        :return: The default facts, empty if the server doesn't announce them.
+        """
+        if self.default_facts is None:
+            try:
+                features = self.sendcmd("FEAT").splitlines()
+            except error_perm:
+                features = []
+            self.default_facts = ()
+            for feature in features:
+                name, _, facts = feature.strip().partition(" ")
+                if name.upper() == "MLST":
+                    self.default_facts = tuple(fact[:-1] for fact in facts.split(";") if fact.endswith("*"))
+        return self.default_facts
+
+    @contextmanager
+    def mlst_facts(self, facts: Optional[List[str]]) -> Iterator[None]:
+        """
+        Asks the server to send only the given facts in MLSD/MLST replies (OPTS MLST) within the block,
+        then restores its default facts, which other operations rely on.
+        Does nothing when facts is None or the server doesn't announce its default facts.
+
+        :param facts: The facts to ask for, e.g. ["type", "size"].
+        """
+        default_facts = self._default_mlst_facts() if facts is not None else ()
+        if not default_facts:
+            yield
+            return
+        self.voidcmd("OPTS MLST " + "".join(f"{fact};" for fact in facts) if facts else "OPTS MLST")
+        try:
+            yield
+        finally:
+            if not self.broken:
+                self.voidcmd("OPTS MLST " + "".join(f"{fact};" for fact in default_facts))
+
+
+class SessionPool:
+    """
+    Extra connections to the server of a session, opened lazily with the session's credentials
+    and reused across calls, so independent transfers can run in parallel.
+    A connection that sat idle for a while is probed before reuse, and replaced if the server dropped it.
+    """
+
+    def __init__(self, host: str, port: int, username: str, password: SecretStr):
+        self._host = host
+        self._port = port
+        self._username = username
+        self._password = password  # kept wrapped, so it can't end up in a repr or a log record
+        self._idle: List[Tuple[SessionFTP, float]] = []  # (connection, time.monotonic() it was returned)
+        self._lock = threading.Lock()
+
+    def serves(self, host: str, port: int, username: str, password: SecretStr) -> bool:
+        """
+        Tells whether the pool connects to the given server with the given credentials.
+        """
+        return ((self._host, self._port, self._username) == (host, port, username)
+                and secrets.compare_digest(self._password.get_secret_value().encode(),
+                                           password.get_secret_value().encode()))
+
+    def _open(self) -> SessionFTP:
+        ftp = SessionFTP()
+        ftp.connect(self._host, self._port)
+        ftp.login(user=self._username, passwd=self._password.get_secret_value())
+        return ftp
+
+    def _checkout(self) -> SessionFTP:
+        """
+        Takes the most recently used idle connection which is still alive, or opens a new one.
+        """
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                ftp, returned_at = self._idle.pop()
+            if time.monotonic() - returned_at < POOL_IDLE_PROBE:
+                return ftp
+            try:
+                ftp.voidcmd('NOOP')
+                return ftp
+            except Exception:
+                ftp.close()
+        return self._open()
+
+    @contextmanager
+    def connection(self) -> Iterator[SessionFTP]:
+        """
+        Checks out a connection from the pool, opening a new one if none is idle.
+        A connection that raised while checked out is closed instead of being returned.
+        """
+        ftp = self._checkout()
+        try:
+            yield ftp
+        except BaseException:
+            ftp.close()
+            raise
+        with self._lock:
+            self._idle.append((ftp, time.monotonic()))
+
+    def close(self) -> None:
+        """
+        Closes all the idle connections of the pool.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for ftp, _ in idle:
+            try:
+                ftp.quit()
+            except Exception:
+                ftp.close()
+
+
+@dataclass
+class FTPSession:
+    """An active FTP session, along with the pool of extra connections to the same server."""
+    ftp: SessionFTP
+    pool: SessionPool
+    last_used: float = 0.0  # time.monotonic() of the last call, successful or not
+    lock: threading.RLock = field(default_factory=threading.RLock)  # serializes commands on the control connection
+
+
+@dataclass
+class WarmSession:
+    """The still logged-in connections of a disconnected session, kept for reuse by ftp_connect."""
+    ftp: SessionFTP
+    pool: SessionPool
+    parked_at: float  # time.monotonic() of the disconnection
+
+
+# Dictionary of active FTP sessions, from the least to the most recently used
+ftp_sessions: OrderedDict[str, FTPSession] = OrderedDict()
+# Guards adding and removing entries in ftp_sessions
+_sessions_lock = threading.Lock()
+# Disconnected sessions kept for reuse, from the least to the most recently disconnected
+_warm_sessions: List[WarmSession] = []
+# Guards _warm_sessions
+_warm_lock = threading.Lock()
+# Listing generation by (host, port, user), replaced with a new number whenever one of the user's connections
+# to the server may have changed the file system
+_listing_generations: Dict[Tuple[str, int, Optional[str]], int] = {}
+_generation_counter = itertools.count(1)
+
+
+def _get_session(session_id: str) -> FTPSession:
+    """
+    Looks up an active session.
+    :param session_id: The unique ID of the session.
+    :return: The FTPSession object.
+    :raises ToolError: If the session ID is invalid.
+    """
+    session = ftp_sessions.get(session_id)
+    if not session:
+        raise ToolError(f"Session with ID '{session_id}' not found. Please connect first.")
+    return session
+
+
+def _check_session(session_id: str) -> SessionFTP:
     """
     Helper function to validate and retrieve an active FTP connection.
+    Must be called while holding the session's lock.
     :param session_id: The unique ID of the session.
     :return: The ftplib.FTP object.
     :raises ToolError: If the session ID is invalid or the connection is closed.
     """
-    ftp = ftp_sessions.get(session_id)
-    if not ftp:
-        raise ToolError(f"Session with ID '{session_id}' not found. Please connect first.")
-    
+    session = _get_session(session_id)
+    ftp = session.ftp
+
+    # No NOOP probe here: a dead connection is detected by the call itself, which _use_session then reports
+    if ftp.broken:
+        raise _drop_dead_session(session_id, session)
+
+    return ftp
+
+
+def _drop_dead_session(session_id: str, session: FTPSession) -> ToolError:
+    """
+    Removes a session whose control connection is gone from the session store.
+
+    :param session_id: The unique ID of the session.
+    :param session: The FTPSession object.
+    :return: The error to report to the caller.
+    """
+    logger.warning("Session '%s' timed out or was closed. Removing from session store.", session_id)
+    with _sessions_lock:
+        ftp_sessions.pop(session_id, None)
+    session.pool.close()
+    session.ftp.close()
+    return ToolError(f"Session with ID '{session_id}' timed out or was disconnected. Please reconnect.")
+
+
+@contextmanager
+def _use_session(session_id: str) -> Iterator[FTPSession]:
+    """
+    Validates a session and yields it for the duration of a tool call.
+    A call that broke the control connection removes the session right away and asks the caller to reconnect.
+    The session's lock is held throughout, so concurrent calls on one session never interleave commands.
+
+    :param session_id: The unique ID of the session.
+    :return: The FTPSession object, so the call never has to look the session up in the store again.
+    :raises ToolError: If the session ID is invalid or the connection is closed.
+    """
+    session = _get_session(session_id)
+    with session.lock:
+        ftp = _check_session(session_id)
+        _touch_session(session_id, session)
+        try:
+            yield session
+        except BaseException:
+            if ftp.broken:
+                raise _drop_dead_session(session_id, session)
+            raise
+        finally:
+            session.last_used = time.monotonic()
+
+
+def _touch_session(session_id: str, session: FTPSession) -> None:
+    """
+    Marks a session as the most recently used one.
+
+    :param session_id: The unique ID of the session.
+    :param session: The FTPSession object.
+    """
+    session.last_used = time.monotonic()
+    with _sessions_lock:
+        if session_id in ftp_sessions:
+            ftp_sessions.move_to_end(session_id)
+
+
+def _close_session(session_id: str, session: FTPSession) -> None:
+    """
+    Closes the connections of a session which was already removed from the session store,
+    after waiting for a call still running on it.
+
+    :param session_id: The unique ID of the session.
+    :param session: The FTPSession object.
+    """
+    with session.lock:
+        session.pool.close()
+        try:
+            session.ftp.quit()
+        except Exception:
+            session.ftp.close()
+    logger.info("Session '%s' has been closed.", session_id)
+
+
+def _park_session(session: FTPSession) -> bool:
+    """
+    Keeps the connections of a session which was removed from the session store logged in,
+    so the next ftp_connect to the same server with the same credentials can skip the login.
+
+    :param session: The FTPSession object.
+    :return: Whether the session was kept, otherwise the caller closes it.
+    """
+    # Only CWD is reset on reuse, the state raw commands may have left behind would leak into the next session
+    if session.ftp.broken or session.ftp.raw_commands_sent or session.ftp.home_dir is None:
+        return False
+    # The next session using the connection starts with an empty cache
+    session.ftp.listings.clear()
+    with _warm_lock:
+        if len(_warm_sessions) >= MAX_WARM_SESSIONS:
+            return False
+        _warm_sessions.append(WarmSession(session.ftp, session.pool, time.monotonic()))
+    return True
+
+
+def _close_warm_session(warm: WarmSession) -> None:
+    """
+    Closes the connections of a disconnected session which was taken out of _warm_sessions.
+
+    :param warm: The WarmSession object.
+    """
+    warm.pool.close()
     try:
-        # A simple command to check whether the connection is still alive
-        ftp.voidcmd('NOOP')
+        warm.ftp.quit()
     except Exception:
-        logger.warning(f"Session '{session_id}' timed out or was closed. Removing from session store.")
-        del ftp_sessions[session_id]
-        raise ToolError(f"Session with ID '{session_id}' timed out or was disconnected. Please reconnect.")
+        warm.ftp.close()
 
-    return ftp
 
+def _take_warm_session(host: str, port: int, username: str, password: SecretStr) -> Optional[WarmSession]:
+    """
+    Takes the most recently disconnected session to the given server with the given credentials,
+    as long as it is still alive. Its connection is moved back to the login directory,
+    which also checks it still works.
 
-def ftp_connect(host: str, username: str, password: str, port: int = 21) -> str:
+    :return: The WarmSession object, or None if there is no usable one.
+    """
+    while True:
+        with _warm_lock:
+            matching = [warm for warm in _warm_sessions if warm.pool.serves(host, port, username, password)]
+            if not matching:
+                return None
+            warm = matching[-1]
+            _warm_sessions.remove(warm)
+        if time.monotonic() - warm.parked_at < WARM_SESSION_TTL:
+            try:
+                warm.ftp.cwd(warm.ftp.home_dir)
+                return warm
+            except Exception:
+                pass
+        _close_warm_session(warm)
+
+
+def expire_idle_sessions() -> int:
+    """
+    Closes the sessions which went unused for longer than SESSION_IDLE_TIMEOUT,
+    so clients that never disconnect don't leak connections.
+    Disconnected sessions kept for longer than WARM_SESSION_TTL are closed as well.
+    A session busy with a call is skipped, even a call which started longer than SESSION_IDLE_TIMEOUT ago.
+
+    :return: The number of sessions closed.
+    """
+    deadline = time.monotonic() - SESSION_IDLE_TIMEOUT
+    expired = []
+    with _sessions_lock:
+        # The store is kept in least recently used order, so the expired sessions come first
+        for session_id, session in ftp_sessions.items():
+            if session.last_used > deadline:
+                break
+            # Not blocking, as the lock of a busy session is held for the whole call
+            if session.lock.acquire(blocking=False):
+                expired.append((session_id, session))
+        for session_id, _ in expired:
+            del ftp_sessions[session_id]
+    for session_id, session in expired:
+        try:
+            logger.info("Session '%s' was idle for too long, closing it.", session_id)
+            _close_session(session_id, session)
+        finally:
+            session.lock.release()
+
+    warm_deadline = time.monotonic() - WARM_SESSION_TTL
+    with _warm_lock:
+        stale = [warm for warm in _warm_sessions if warm.parked_at <= warm_deadline]
+        _warm_sessions[:] = [warm for warm in _warm_sessions if warm.parked_at > warm_deadline]
+    for warm in stale:
+        _close_warm_session(warm)
+    return len(expired)
+
+
+def keep_sessions_alive() -> int:
+    """
+    Sends a NOOP on the sessions which went unused for longer than KEEPALIVE_INTERVAL,
+    so the server doesn't close them for inactivity between two tool calls.
+    A session busy with a call is skipped, and a session whose connection turns out to be dead is removed.
+
+    :return: The number of sessions probed.
+    """
+    deadline = time.monotonic() - KEEPALIVE_INTERVAL
+    with _sessions_lock:
+        idle = [(session_id, session) for session_id, session in ftp_sessions.items() if session.last_used <= deadline]
+    probed = 0
+    for session_id, session in idle:
+        if not session.lock.acquire(blocking=False):
+            continue
+        try:
+            # Disconnected since the snapshot: its connection may already be parked or in use by a new session
+            if ftp_sessions.get(session_id) is not session:
+                continue
+            session.ftp.voidcmd("NOOP")
+            probed += 1
+        except Exception:
+            _drop_dead_session(session_id, session)
+        finally:
+            session.lock.release()
+    return probed
+
+
+def ftp_connect(host: str, username: str, password: SecretStr, port: int = 21) -> Dict[str, str]:
     """
     Connects to an FTP server.
+    The logged-in connections of a recently disconnected session to the same server are reused when possible.
 
     :param host: The FTP server address.
     :param username: The username for authentication.
     :param password: The password for authentication.
     :param port: The FTP server port.
-    :return: A confirmation message containing the unique session ID.
+    :return: A dictionary with the unique session ID under "session_id" and a confirmation message under "message".
     """
     try:
-        session_id = str(uuid.uuid4()) # Generate unique session ID
-
-        ftp = FTP()
-        ftp.connect(host, port)
-        ftp.login(user=username, passwd=password)
-
-        ftp_sessions[session_id] = ftp
-        logger.info(f"New session '{session_id}' established for user '{username}' on host '{host}'.")
+        session_id = secrets.token_urlsafe(16) # Generate unique session ID
+
+        # Direct callers may pass a plain string, the MCP layer validates it into a SecretStr
+        password = password if isinstance(password, SecretStr) else SecretStr(password)
+        warm = _take_warm_session(host, port, username, password)
+        if warm:
+            ftp, pool = warm.ftp, warm.pool
+            logger.info("Reusing a logged-in connection to host '%s' for user '%s'.", host, username)
+        else:
+            ftp = SessionFTP()
+            ftp.connect(host, port)
+            ftp.login(user=username, passwd=password.get_secret_value())
+            ftp.home_dir = ftp.pwd()
+            pool = SessionPool(host, port, username, password)
+
+        now = time.monotonic()
+        evicted = None
+        with _sessions_lock:
+            if len(ftp_sessions) >= MAX_SESSIONS:
+                evicted = ftp_sessions.popitem(last=False)
+            ftp_sessions[session_id] = FTPSession(ftp, pool, last_used=now)
+        if evicted:
+            logger.info("Too many open sessions, closing the least recently used session '%s'.", evicted[0])
+            _close_session(*evicted)
+        logger.info("New session '%s' established for user '%s' on host '%s'.", session_id, username, host)
         welcome_msg = ftp.getwelcome()
-        return f"Successfully connected to the FTP server. Your session ID is: {session_id}.\n Server's Welcome message: {welcome_msg}"
+        return {"session_id": session_id,
+                "message": f"Successfully connected to the FTP server.\n Server's Welcome message: {welcome_msg}"}
     except Exception as e:
-        logger.exception(f"Failed to connect to FTP server '{host}' with user '{username}'.")
+        logger.exception("Failed to connect to FTP server '%s' with user '%s'.", host, username)
         raise ToolError(f"Failed to connect to FTP server: {e}")
 
 
 def ftp_disconnect(session_id: str) -> str:
     """
     Disconnects from the FTP server.
+    The connections of the session may stay logged in for a short while, for a later ftp_connect to reuse.
     
     :param session_id: The unique ID of the active session.
     :return: A success message.
     """
-    ftp = ftp_sessions.get(session_id)
-    if not ftp:
+    session = ftp_sessions.get(session_id)
+    if not session:
         return f"Session with ID '{session_id}' was not found or already disconnected."
-    try:
-        ftp.quit()
-        del ftp_sessions[session_id]
-        logger.info(f"Session '{session_id}' has been closed.")
-        return f"Session '{session_id}' disconnected successfully."
-    except Exception as e:
-        logger.exception(f"Error while disconnecting session '{session_id}'.")
-        raise ToolError(f"Error while disconnecting session '{session_id}': {e}")
+    with session.lock:
+        with _sessions_lock:
+            if ftp_sessions.pop(session_id, None) is None:
+                return f"Session with ID '{session_id}' was not found or already disconnected."
+        try:
+            if _park_session(session):
+                logger.info("Session '%s' has been closed, its connections are kept for reuse.", session_id)
+            else:
+                session.pool.close()
+                session.ftp.quit()
+                logger.info("Session '%s' has been closed.", session_id)
+            return f"Session '{session_id}' disconnected successfully."
+        except Exception as e:
+            logger.exception("Error while disconnecting session '%s'.", session_id)
+            raise ToolError(f"Error while disconnecting session '{session_id}': {e}")
 
 
-def _ftp_list_by_method(list_method: str, session_id: str, directory: str) -> List[Union[str, Dict[str, Any]]]:
+def _ftp_list_by_method(list_method: str, session_id: str, directory: str,
+                        facts: Optional[List[str]] = None) -> List[Union[str, Dict[str, Any]]]:
     """
     Lists the contents of a directory on a remote FTP server by the chosen list method
     Returns a list of the directory content according to the listing method.
+    A listing made less than LISTING_CACHE_TTL seconds ago is reused, unless a session of the same user changed
+    something since. A change made by another FTP client shows up once the cached listing expires.
     
     :param list_method: The ftp listing method
     :param session_id: The unique ID of the active session.
     :param directory: The directory to list. Defaults to the user's current directory.
+    :param facts: For MLSD, the facts to ask the server for. Defaults to the ones it sends by default.
     :return: A list of filenames in the specified directory.
     """
-    ftp = _check_session(session_id)
-    files_output = []
-    try:
-        original_cwd = ftp.pwd()
-
-        ftp.cwd(directory)
-        if "NLST" == list_method:
-            files_output = ftp.nlst()
-        elif "LIST" == list_method:
-            ftp.retrlines(list_method, files_output.append)
-        elif "MLSD" == list_method:
-            if not hasattr(ftp, 'mlsd'):
-                logger.exception(f"MLSD command not supported, failed executing for session '{session_id}'.")
-                raise ToolError("MLSD command not supported by this FTP server or Python version.")
-            raw_output = list(ftp.mlsd())
-            files_output = [{"filename": filename, "attributes": attributes} for filename, attributes in raw_output]
-
-        ftp.cwd(original_cwd)
-
-        logger.info(f"{list_method}: Listed directory '{directory}' for session '{session_id}'.")
-        return files_output
-    except Exception as e:
-        logger.exception(f"Error listing '{directory}' with the '{list_method}' command for session '{session_id}'.")
-        raise ToolError(f"Error listing directory ({list_method}): {e}")
+    with _use_session(session_id) as session:
+        ftp = session.ftp
+        files_output = []
+        try:
+            cache_key = (list_method, ftp.pwd(), directory, tuple(facts) if facts is not None else None)
+            # Read before listing, so a change made while listing leaves the new entry stale
+            generation = ftp.listing_generation
+            cached = ftp.listings.get(cache_key)
+            if cached and cached[1] == generation and time.monotonic() - cached[0] < LISTING_CACHE_TTL:
+                logger.info("%s: Listed directory '%s' for session '%s' from the cache.", list_method, directory, session_id)
+                return cached[2]
+
+            # The listing commands take the directory as an argument, so the working directory is left untouched
+            if "NLST" == list_method:
+                files_output = ftp.nlst(directory)
+            elif "LIST" == list_method:
+                ftp.retrlines(f"{list_method} {directory}", files_output.append)
+            elif "MLSD" == list_method:
+                if not hasattr(ftp, 'mlsd'):
+                    logger.exception("MLSD command not supported, failed executing for session '%s'.", session_id)
+                    raise ToolError("MLSD command not supported by this FTP server or Python version.")
+                # Built in a single pass over the parsed reply lines
+                with ftp.mlst_facts(facts):
+                    files_output = [{"filename": filename, "attributes": attributes}
+                                    for filename, attributes in ftp.mlsd(path=directory)]
+
+            ftp.listings[cache_key] = (time.monotonic(), generation, files_output)
+            logger.info("%s: Listed directory '%s' for session '%s'.", list_method, directory, session_id)
+            return files_output
+        except Exception as e:
+            logger.exception("Error listing '%s' with the '%s' command for session '%s'.", directory, list_method, session_id)
+            raise ToolError(f"Error listing directory ({list_method}): {e}")
 
 
 def ftp_nlst(session_id: str, directory: str = ".") -> List[str]:
@@ -144,7 +672,7 @@ def ftp_list(session_id: str, directory: str = ".") -> List[str]:
     return _ftp_list_by_method("LIST", session_id, directory)
 
 
-def ftp_mlsd(session_id: str, directory: str = ".") -> List[Dict[str, Any]]:
+def ftp_mlsd(session_id: str, directory: str = ".", facts: Optional[List[str]] = None) -> List[Dict[str, Any]]:
     """
     Lists the contents of a directory on a remote FTP server using the MLSD command.
     Returns a structured list of dictionaries, with each dictionary containing a 
@@ -152,30 +680,114 @@ def ftp_mlsd(session_id: str, directory: str = ".") -> List[Dict[str, Any]]:
     
     :param session_id: The unique ID of the active session.
     :param directory: The directory to list. Defaults to the user's current directory.
+    :param facts: The attributes to return for every entry, e.g. ["type", "size"]. Defaults to all of them.
     :return: A structured list of dictionaries with file information.
     """
-    return _ftp_list_by_method("MLSD", session_id, directory)
-
-
-def ftp_retrieve_file(session_id: str, filename: str) -> str:
+    if facts is None:
+        return _ftp_list_by_method("MLSD", session_id, directory)
+    # Fact names are case-insensitive, ftplib reports them in lower case
+    wanted = {fact.lower() for fact in facts}
+    # The server is asked for the wanted facts only, which keeps the reply short. Servers which can't be asked
+    # send all of them, so the entries are filtered here as well
+    files_output = _ftp_list_by_method("MLSD", session_id, directory, sorted(wanted))
+    return [{"filename": entry["filename"],
+             "attributes": {name: value for name, value in entry["attributes"].items() if name in wanted}}
+            for entry in files_output]
+
+
+def ftp_retrieve_file(session_id: str, filename: str, local_filepath: Optional[str] = None) -> str:
     """
     Retrieves a file from a FTP server using an active session.
 
     :param session_id: The unique ID of the active session.
     :param filename: The name of the file to retrieve.
+    :param local_filepath: A local path to save the file to, instead of returning its content.
+                           The file is streamed to disk, so it never has to fit in memory.
+    :return: The content of the file as a string, or a success message if it was saved to local_filepath.
+    """
+    with _use_session(session_id) as session:
+        ftp = session.ftp
+        try:
+            if local_filepath:
+                # Downloaded next to the target and moved over it once complete,
+                # so a failed download doesn't destroy an existing local file
+                partial_filepath = f"{local_filepath}.{secrets.token_hex(8)}.part"
+                try:
+                    with open(partial_filepath, 'xb') as f:
+                        ftp.retrbinary(f"RETR {filename}", f.write, blocksize=BLOCK_SIZE)
+                    os.replace(partial_filepath, local_filepath)
+                except BaseException:
+                    if os.path.exists(partial_filepath):
+                        os.remove(partial_filepath)
+                    raise
+                logger.info("Saved '%s' to '%s' for session '%s'.", filename, local_filepath, session_id)
+                return f"File '{filename}' saved to '{local_filepath}'."
+
+            # Blocks are appended in place to a single buffer, instead of collected and joined
+            content_buffer = bytearray()
+            ftp.retrbinary(f"RETR {filename}", content_buffer.extend, blocksize=BLOCK_SIZE)
+            # Undecodable bytes of a binary file are replaced instead of failing the whole retrieval
+            content = content_buffer.decode("utf-8", errors="replace")
+            logger.info("Retrieved content of '%s' for session '%s'.", filename, session_id)
+            return content
+        except Exception as e:
+            logger.exception("Error retrieving file '%s' for session '%s'.", filename, session_id)
+            raise ToolError(f"Error retrieving file content: {e}")
+
+
+def _retrieve_pooled(pool: SessionPool, filename: str) -> str:
+    """
+    Retrieves a file over a connection checked out from the session pool.
+
+    :param pool: The pool of the session.
+    :param filename: The absolute path of the file to retrieve.
     :return: The content of the file as a string.
     """
-    ftp = _check_session(session_id)
-    content_list = []
+    content_buffer = bytearray()
+    with pool.connection() as ftp:
+        ftp.retrbinary(f"RETR {filename}", content_buffer.extend, blocksize=BLOCK_SIZE)
+    return content_buffer.decode("utf-8", errors="replace")
+
+
+def ftp_retrieve_many(session_id: str, filenames: List[str]) -> Dict[str, str]:
+    """
+    Retrieves several files from a FTP server using an active session.
+    The files are downloaded in parallel over a pool of connections.
+
+    :param session_id: The unique ID of the active session.
+    :param filenames: The names of the files to retrieve.
+    :return: A dictionary mapping every file name to its content as a string.
+    """
+    with _use_session(session_id) as session:
+        ftp = session.ftp
+        pool = session.pool
+        try:
+            # The pool connections don't share the session's working directory
+            cwd = ftp.pwd()
+            paths = [_absolute_path(cwd, filename) for filename in filenames]
+            with ThreadPoolExecutor(max_workers=POOL_SIZE) as executor:
+                contents = list(executor.map(_retrieve_pooled, [pool] * len(paths), paths))
+            logger.info("Retrieved content of %d files for session '%s'.", len(filenames), session_id)
+            return dict(zip(filenames, contents))
+        except Exception as e:
+            logger.exception("Error retrieving files %s for session '%s'.", filenames, session_id)
+            raise ToolError(f"Error retrieving file content: {e}")
+
+def _upload_file(ftp: SessionFTP, command: str, f: BinaryIO) -> None:
+    """
+    Uploads an open local file with socket.sendfile, which lets the kernel copy it straight
+    into the data connection instead of reading it block by block through Python.
+    socket.sendfile falls back to plain sends where os.sendfile isn't available.
+
+    :param ftp: The ftp instance
+    :param command: The store command, e.g. "STOR <filename>".
+    :param f: The local file, opened in binary mode.
+    """
+    ftp.set_transfer_type('I')
+    with ftp.transfercmd(command) as conn:
+        conn.sendfile(f)
+    ftp.voidresp()
 
-    try:
-        ftp.retrbinary(f"RETR {filename}", content_list.append)
-        content = b"".join(content_list).decode("utf-8")
-        logger.info(f"Retrieved content of '{filename}' for session '{session_id}'.")
-        return content
-    except Exception as e:
-        logger.exception(f"Error retrieving file '{filename}' for session '{session_id}'.")
-        raise ToolError(f"Error retrieving file content: {e}")
 
 def _ftp_store_methods_helper(session_id: str, is_unique_store: bool, local_filepath: str, 
                               remote_filename: Optional[str] = None) -> str:
@@ -188,38 +800,45 @@ def _ftp_store_methods_helper(session_id: str, is_unique_store: bool, local_file
     :param remote_filename: The name to save the file as on the server. If None, uses the local filename.
     :return: A success message.
     """
-    ftp = _check_session(session_id)
-
-    error_message = f"Error uploading '{local_filepath}' to session '{session_id}'."
-
-    if not Path(local_filepath).exists():
-        logger.exception(error_message)
-        raise ToolError(f"Local file not found: {local_filepath}")
-
-    try:
-        with open(local_filepath, 'rb') as f:
-            if is_unique_store:
-                # Send STOU command and parse the unique filename from the server's response
-                stou_command = f"STOU {Path(local_filepath).name}" # Suggest a name, server will make it unique
-                server_response = ftp.sendcmd(stou_command)
-                # Expected response: 150 FILE: <filename>
-                match = re.search(r'FILE: (.+)', server_response)
-                if not match:
-                    raise ToolError(f"Failed to parse unique filename from STOU response: {server_response}")
-                unique_filename = match.group(1).strip()
-
-                # Upload the file using the unique filename provided by the server
-                ftp.storbinary(f"STOR {unique_filename}", f)
-                logger.info(f"Uploaded '{local_filepath}' to '{unique_filename}' for session '{session_id}'.")
-                return f"File uploaded successfully with unique name: {unique_filename}"
-            else:
-                remote_filename = remote_filename or Path(local_filepath).name
-                ftp.storbinary(f"STOR {remote_filename}", f)
-                logger.info(f"Uploaded '{local_filepath}' to '{remote_filename}' for session '{session_id}'.")
-                return f"File '{local_filepath}' uploaded successfully."
-    except Exception as e:
-        logger.exception(error_message)
-        raise ToolError(f"Error uploading file: {e}")
+    with _use_session(session_id) as session:
+        ftp = session.ftp
+
+        local_filename = os.path.basename(local_filepath)
+
+        try:
+            # Opening the file is the existence check, no separate stat that could race with it
+            f = open(local_filepath, 'rb')
+        except FileNotFoundError:
+            logger.exception("Error uploading '%s' to session '%s'.", local_filepath, session_id)
+            raise ToolError(f"Local file not found: {local_filepath}")
+        except OSError as e:
+            # E.g. a directory or a file without read permission
+            logger.exception("Error uploading '%s' to session '%s'.", local_filepath, session_id)
+            raise ToolError(f"Error uploading file: {e}")
+
+        try:
+            with f:
+                if is_unique_store:
+                    # Send STOU command and parse the unique filename from the server's response
+                    stou_command = f"STOU {local_filename}" # Suggest a name, server will make it unique
+                    server_response = ftp.sendcmd(stou_command)
+                    # Expected response: 150 FILE: <filename>
+                    unique_filename = server_response.partition("FILE:")[2].strip()
+                    if not unique_filename:
+                        raise ToolError(f"Failed to parse unique filename from STOU response: {server_response}")
+
+                    # Upload the file using the unique filename provided by the server
+                    _upload_file(ftp, f"STOR {unique_filename}", f)
+                    logger.info("Uploaded '%s' to '%s' for session '%s'.", local_filepath, unique_filename, session_id)
+                    return f"File uploaded successfully with unique name: {unique_filename}"
+                else:
+                    remote_filename = remote_filename or local_filename
+                    _upload_file(ftp, f"STOR {remote_filename}", f)
+                    logger.info("Uploaded '%s' to '%s' for session '%s'.", local_filepath, remote_filename, session_id)
+                    return f"File '{local_filepath}' uploaded successfully."
+        except Exception as e:
+            logger.exception("Error uploading '%s' to session '%s'.", local_filepath, session_id)
+            raise ToolError(f"Error uploading file: {e}")
 
 
 def ftp_store_file(session_id: str, local_filepath: str, remote_filename: Optional[str] = None) -> str:
@@ -253,33 +872,204 @@ def ftp_rename(session_id: str, from_name: str, to_name: str) -> str:
     :param to_name: The new name for the file.
     :return: A success message.
     """
-    ftp = _check_session(session_id)
-    try:
-        ftp.rename(from_name, to_name)
-        logger.info(f"Renamed file from '{from_name}' to '{to_name}' for session '{session_id}'.")
-        return f"Successfully renamed '{from_name}' to '{to_name}'."
-    except Exception as e:
-        logger.exception(f"Error renaming file from '{from_name}' to '{to_name}' for session '{session_id}'.")
-        raise ToolError(f"Error renaming file: {e}")
-
-
-def _is_dir(ftp: FTP, remote_path: str) -> bool:
+    with _use_session(session_id) as session:
+        ftp = session.ftp
+        try:
+            ftp.rename(from_name, to_name)
+            logger.info("Renamed file from '%s' to '%s' for session '%s'.", from_name, to_name, session_id)
+            return f"Successfully renamed '{from_name}' to '{to_name}'."
+        except Exception as e:
+            logger.exception("Error renaming file from '%s' to '%s' for session '%s'.", from_name, to_name, session_id)
+            raise ToolError(f"Error renaming file: {e}")
+
+
+def _is_dir(ftp: SessionFTP, remote_path: str, original_cwd: Optional[str] = None) -> bool:
     """
     Verifys if a given path on the FTP server is a directory.
+    Asks with MLST, which takes a single round-trip and leaves the working directory alone;
+    servers without MLST are probed by changing into the path and back.
 
     :param ftp_session: The ftp instance
     :param remote_path: The path to check
+    :param original_cwd: The current directory of the connection, if the caller already knows it.
     :return: whether the given path is a directory
     """
     try:
-        original_cwd = ftp.pwd()
-        ftp.cwd(remote_path)
+        response = ftp.sendcmd(f"MLST {remote_path}")
+    except error_perm as e:
+        if not str(e).startswith(("500", "502")): # Anything but "command not supported" means there's no such directory
+            return False
+    else:
+        # RFC 3659: the facts are on the line starting with a space, e.g. " type=dir;size=4096; /path"
+        for line in response.splitlines()[1:]:
+            if line.startswith(" "):
+                for fact in line[1:].partition(" ")[0].lower().split(";"):
+                    if fact.startswith("type="):
+                        return fact in ("type=dir", "type=cdir", "type=pdir")
+        # The server doesn't report the type, fall back to probing
+
+    try:
+        original_cwd = original_cwd or ftp.pwd()
+        try:
+            ftp.cwd(remote_path)
+        except error_perm:
+            # Not a directory, the connection stayed where it was
+            ftp.current_dir = original_cwd
+            return False
         ftp.cwd(original_cwd)
+        # Back where it started, so the next PWD can still be answered from the cache
+        ftp.current_dir = original_cwd
         return True
     except Exception:
         return False
 
 
+def _absolute_path(cwd: str, remote_path: str) -> str:
+    """
+    Resolves a path against the current directory of a connection, so it can be used on the
+    pool connections, which don't share the working directory of the session.
+
+    :param cwd: The current directory of the connection, as returned by PWD
+    :param remote_path: The path to resolve
+    :return: The absolute, normalized path
+    """
+    return posixpath.normpath(posixpath.join(cwd, remote_path))
+
+
+def _list_children(ftp: SessionFTP, remote_path: str) -> List[Tuple[str, Dict[str, str]]]:
+    """
+    Lists the entries of a directory with their MLSD facts, excluding '.' and '..'.
+    The 'type' fact tells directories from files without probing each entry; if the server
+    doesn't report it, it is filled in by probing with _is_dir.
+
+    :param ftp: The ftp instance
+    :param remote_path: The directory to list
+    :return: (name, facts) pairs for every entry of the directory
+    """
+    children = []
+    for name, facts in ftp.mlsd(path=remote_path):
+        if name in ('.', '..') or facts.get("type") in ("cdir", "pdir"):
+            continue
+        if "type" not in facts:
+            facts["type"] = "dir" if _is_dir(ftp, posixpath.join(remote_path, name)) else "file"
+        children.append((name, facts))
+    return children
+
+
+def _list_children_pooled(pool: SessionPool, remote_path: str) -> List[Tuple[str, Dict[str, str]]]:
+    """
+    Lists the entries of a directory over a connection checked out from the session pool.
+
+    :param pool: The pool of the session.
+    :param remote_path: The absolute path of the directory to list
+    :return: (name, facts) pairs for every entry of the directory
+    """
+    with pool.connection() as ftp:
+        return _list_children(ftp, remote_path)
+
+
+def _mlsd_tree(pool: SessionPool, root: str) -> Dict[str, List[Tuple[str, Dict[str, str]]]]:
+    """
+    Lists a directory tree breadth-first. All the directories of a level are listed
+    in parallel over the session pool.
+
+    :param pool: The pool of the session.
+    :param root: The absolute path of the directory at the top of the tree.
+    :return: The entries of every directory in the tree, keyed by its absolute path, in breadth-first order.
+    """
+    tree: Dict[str, List[Tuple[str, Dict[str, str]]]] = {}
+    level = [root]
+    with ThreadPoolExecutor(max_workers=POOL_SIZE) as executor:
+        while level:
+            next_level = []
+            for directory, children in zip(level, executor.map(_list_children_pooled, [pool] * len(level), level)):
+                tree[directory] = children
+                next_level.extend(posixpath.join(directory, name) for name, facts in children if facts["type"] == "dir")
+            level = next_level
+    return tree
+
+
+def ftp_mlsd_tree(session_id: str, directory: str = ".") -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Lists a whole directory tree on a remote FTP server using the MLSD command.
+    The subdirectories are listed in parallel over a pool of connections.
+
+    :param session_id: The unique ID of the active session.
+    :param directory: The directory at the top of the tree. Defaults to the user's current directory.
+    :return: A dictionary mapping the absolute path of every directory in the tree
+             to a structured list of dictionaries with its file information.
+    """
+    with _use_session(session_id) as session:
+        ftp = session.ftp
+        pool = session.pool
+        try:
+            tree = _mlsd_tree(pool, _absolute_path(ftp.pwd(), directory))
+            logger.info("MLSD: Listed the directory tree of '%s' for session '%s'.", directory, session_id)
+            return {path: [{"filename": name, "attributes": facts} for name, facts in children]
+                    for path, children in tree.items()}
+        except Exception as e:
+            logger.exception("Error listing the directory tree of '%s' for session '%s'.", directory, session_id)
+            raise ToolError(f"Error listing directory tree: {e}")
+
+
+def _pipelined_commands(ftp: SessionFTP, command: str, paths: List[str], ignored_codes: Tuple[str, ...] = ()) -> None:
+    """
+    Runs a command on many paths by sending it in batches without waiting for each reply,
+    which saves a round-trip per path. The server answers commands in order (RFC 959),
+    so the replies are then read and checked one by one.
+    Commands which failed are sent again one at a time, in case the server doesn't cope with pipelining,
+    and if that works the remaining paths aren't pipelined anymore.
+
+    :param ftp: The ftp instance
+    :param command: The command to run on every path, e.g. "DELE", "RMD" or "MKD".
+    :param paths: The paths to run the command on, in order.
+    :param ignored_codes: Error reply codes which are expected and not raised.
+    :raises error_perm: The error of the first path which also failed when sent on its own.
+    :raises ValueError: If a path contains a line break, which would smuggle in another command.
+    """
+    # Checked up front like putline does, as the batches are written past it
+    for path in paths:
+        if "\r" in path or "\n" in path:
+            raise ValueError(f"An illegal newline character is contained in the path {path!r}.")
+
+    def run_serially(batch: List[str]) -> None:
+        for path in batch:
+            try:
+                ftp.voidcmd(f"{command} {path}")
+            except (error_reply, error_temp, error_perm) as e:
+                if not str(e).startswith(ignored_codes):
+                    raise
+
+    # The commands are written to the socket directly, bypassing the cache bookkeeping of putcmd
+    ftp.invalidate_listings()
+    pipelining = True
+    for start in range(0, len(paths), PIPELINE_BATCH_SIZE):
+        batch = paths[start:start + PIPELINE_BATCH_SIZE]
+        if not pipelining:
+            run_serially(batch)
+            continue
+
+        try:
+            ftp.sock.sendall("".join(f"{command} {path}\r\n" for path in batch).encode(ftp.encoding))
+        except OSError:
+            # Written past putline, which would otherwise mark the dead connection
+            ftp.broken = True
+            raise
+
+        # Every reply must be consumed to keep the control connection in sync, even after an error
+        failed = []
+        for path in batch:
+            try:
+                ftp.voidresp()
+            except (error_reply, error_temp, error_perm) as e:
+                if not str(e).startswith(ignored_codes):
+                    failed.append(path)
+        if failed:
+            run_serially(failed)
+            # The failures were caused by the pipelining, not by the paths
+            pipelining = False
+
+
 def ftp_delete_recursive(session_id: str, remote_path: str) -> str:
     """
     Recursively deletes a file or directory on the remote FTP server.
@@ -288,62 +1078,165 @@ def ftp_delete_recursive(session_id: str, remote_path: str) -> str:
     :param remote_path: The path to the file or directory to delete.
     :return: A success message.
     """
-    ftp = _check_session(session_id)
-    try:
-        if _is_dir(ftp, remote_path):
-            # It's a directory, so we need to recursively delete its contents
-            for name, _ in ftp.mlsd(path=remote_path):
-                if name not in ('.', '..'):
-                    ftp_delete_recursive(session_id, f"{remote_path}/{name}")
-            ftp.rmd(remote_path)
-            logger.info(f"Recursively deleted directory '{remote_path}' for session '{session_id}'.")
-        else:
-            # It's a file, so we can just delete it
-            ftp.delete(remote_path)
-            logger.info(f"Deleted file '{remote_path}' for session '{session_id}'.")
+    with _use_session(session_id) as session:
+        ftp = session.ftp
+        pool = session.pool
+        try:
+            # One PWD serves both the directory check and the path the tree is listed from
+            cwd = ftp.pwd()
+            root = _absolute_path(cwd, remote_path)
+            if _is_dir(ftp, root, cwd):
+                # It's a directory, so we list the whole tree, delete all its files and then the directories bottom-up
+                tree = _mlsd_tree(pool, root)
+                _pipelined_commands(ftp, "DELE", [posixpath.join(directory, name) for directory, children in tree.items()
+                                                  for name, facts in children if facts["type"] != "dir"])
+                # Breadth-first order reversed puts every directory after its subdirectories
+                _pipelined_commands(ftp, "RMD", list(reversed(tree)))
+                logger.info("Recursively deleted directory '%s' for session '%s'.", remote_path, session_id)
+            else:
+                # It's a file, so we can just delete it
+                ftp.delete(remote_path)
+                logger.info("Deleted file '%s' for session '%s'.", remote_path, session_id)
         
-        return f"Successfully deleted '{remote_path}'."
-    except Exception as e:
-        logger.exception(f"Error deleting '{remote_path}' for session '{session_id}'.")
-        raise ToolError(f"Error deleting '{remote_path}': {e}")
+            return f"Successfully deleted '{remote_path}'."
+        except Exception as e:
+            logger.exception("Error deleting '%s' for session '%s'.", remote_path, session_id)
+            raise ToolError(f"Error deleting '{remote_path}': {e}")
+
+
+def ftp_delete_many(session_id: str, filenames: List[str]) -> str:
+    """
+    Deletes several files on the remote FTP server.
+    The DELE commands are pipelined, so the whole batch costs about one round-trip.
+
+    :param session_id: The unique ID of the active session.
+    :param filenames: The paths of the files to delete.
+    :return: A success message.
+    """
+    with _use_session(session_id) as session:
+        ftp = session.ftp
+        try:
+            _pipelined_commands(ftp, "DELE", filenames)
+            logger.info("Deleted %d files for session '%s'.", len(filenames), session_id)
+            return f"Successfully deleted {len(filenames)} files."
+        except Exception as e:
+            logger.exception("Error deleting files %s for session '%s'.", filenames, session_id)
+            raise ToolError(f"Error deleting files: {e}")
+
+
+def _copy_file(source_ftp: SessionFTP, destination_ftp: SessionFTP, source_path: str, destination_path: str) -> None:
+    """
+    Copies a single file on the FTP server by relaying its download straight into the upload of the destination
+    through one fixed-size buffer, so the upload starts with the first block instead of after the whole file,
+    and memory use doesn't depend on the file size. The kernel buffers of both data connections let the
+    two transfers run ahead of each other.
+
+    :param source_ftp: The ftp instance to download the source file with.
+    :param destination_ftp: The ftp instance to upload the destination file with.
+    :param source_path: The path of the file to copy.
+    :param destination_path: The destination path.
+    """
+    buffer = bytearray(BLOCK_SIZE)
+    view = memoryview(buffer)
+
+    # Open the download before the upload, so a missing source file fails without touching the destination
+    source_ftp.set_transfer_type('I')
+    with source_ftp.transfercmd(f"RETR {source_path}") as source_conn:
+        destination_ftp.set_transfer_type('I')
+        with destination_ftp.transfercmd(f"STOR {destination_path}") as destination_conn:
+            while received := source_conn.recv_into(buffer):
+                destination_conn.sendall(view[:received])
+    # Both data connections are closed by now, which completes the transfers
+    destination_ftp.voidresp()
+    source_ftp.voidresp()
+
+
+def _copy_file_pooled(pool: SessionPool, source_path: str, destination_path: str) -> None:
+    """
+    Copies a single file on the FTP server over two connections checked out from the session pool.
+
+    :param pool: The pool of the session.
+    :param source_path: The path of the file to copy.
+    :param destination_path: The destination path.
+    """
+    with pool.connection() as source_ftp, pool.connection() as destination_ftp:
+        _copy_file(source_ftp, destination_ftp, source_path, destination_path)
+
+
+def _create_copy_tree(ftp: FTP, pool: SessionPool, source_root: str, destination_root: str) -> List[Tuple[str, str]]:
+    """
+    Recreates the directory tree of source_root under destination_root, parents before children,
+    and collects a (source, destination) pair for every file in the tree.
+    The largest files come first, so a big file started last doesn't leave the other workers idle at the end.
+
+    :param ftp: The ftp instance
+    :param pool: The pool of the session.
+    :param source_root: The absolute path of the directory to copy.
+    :param destination_root: The absolute path of the destination directory.
+    :return: The file copy jobs.
+    """
+    sized_jobs = []
+    destination_dirs = []
+    for directory, children in _mlsd_tree(pool, source_root).items():
+        # Every directory of the tree was joined onto source_root, so its relative part is just the rest of the path
+        relative_dir = directory[len(source_root):].lstrip("/")
+        destination_dir = posixpath.join(destination_root, relative_dir) if relative_dir else destination_root
+        destination_dirs.append(destination_dir)
+        sized_jobs.extend((int(facts.get("size", 0)), posixpath.join(directory, name), posixpath.join(destination_dir, name))
+                          for name, facts in children if facts["type"] != "dir")
+
+    # The tree is in breadth-first order, so every MKD is sent after the one of its parent
+    _pipelined_commands(ftp, "MKD", destination_dirs, ignored_codes=("550",)) # Directory may already exist
+
+    sized_jobs.sort(key=lambda job: job[0], reverse=True)
+    return [(source, destination) for _, source, destination in sized_jobs]
 
 
 def ftp_copy_recursive(session_id: str, source_path: str, destination_path: str) -> str:
     """
     Recursively copies a file or directory on the remote FTP server.
+    The files of a directory are copied in parallel over a pool of connections.
 
     :param session_id: The unique ID of the active session.
     :param source_path: The path to the file or directory to copy.
     :param destination_path: The destination path.
     :return: A success message.
     """
-    ftp = _check_session(session_id)
-    try:
-        if _is_dir(ftp, source_path):
-            # It's a directory, we need to create the destination directory and then recursively copy its contents
-            try:
-                ftp.mkd(destination_path)
-            except error_perm as e:
-                if "550" not in str(e): # Directory may already exist
-                    logger.exception(f"Error copying '{source_path}' to '{destination_path}' for session '{session_id}'.")
-                    raise ToolError(f"Error copying '{source_path}', couldn't create the new directory: {e}")
-            
-            for name, _ in ftp.mlsd(path=source_path):
-                if name not in ('.', '..'):
-                    ftp_copy_recursive(session_id, f"{source_path}/{name}", f"{destination_path}/{name}")
-            logger.info(f"Recursively copied directory '{source_path}' to '{destination_path}' for session '{session_id}'.")
-        else:
-            # It's a file, we can just download it and then upload it to the destination
-            in_memory_file = io.BytesIO()
-            ftp.retrbinary(f"RETR {source_path}", in_memory_file.write)
-            in_memory_file.seek(0)
-            ftp.storbinary(f"STOR {destination_path}", in_memory_file)
-            logger.info(f"Copied file '{source_path}' to '{destination_path}' for session '{session_id}'.")
+    with _use_session(session_id) as session:
+        ftp = session.ftp
+        pool = session.pool
+        try:
+            # The pool connections don't share the session's working directory
+            cwd = ftp.pwd()
+            source_root, destination_root = _absolute_path(cwd, source_path), _absolute_path(cwd, destination_path)
+            # The upload would truncate the files while they are still being downloaded
+            if source_root == destination_root:
+                raise ValueError("The source and the destination are the same path.")
+            if _is_dir(ftp, source_root, cwd):
+                # It's a directory, we create the destination tree first and then copy the files in parallel
+                file_jobs = _create_copy_tree(ftp, pool, source_root, destination_root)
+
+                with ThreadPoolExecutor(max_workers=POOL_SIZE) as executor:
+                    futures = [executor.submit(_copy_file_pooled, pool, source, destination)
+                               for source, destination in file_jobs]
+                    try:
+                        for future in futures:
+                            future.result()
+                    except Exception:
+                        # Don't start the copies still queued once one of them failed
+                        for future in futures:
+                            future.cancel()
+                        raise
+                logger.info("Recursively copied directory '%s' to '%s' for session '%s'.", source_path, destination_path, session_id)
+            else:
+                # It's a file, we can just stream it to the destination
+                _copy_file_pooled(pool, source_root, destination_root)
+                logger.info("Copied file '%s' to '%s' for session '%s'.", source_path, destination_path, session_id)
         
-        return f"Successfully copied '{source_path}' to '{destination_path}'."
-    except Exception as e:
-        logger.exception(f"Error copying '{source_path}' to '{destination_path}' for session '{session_id}'.")
-        raise ToolError(f"Error copying '{source_path}': {e}")
+            return f"Successfully copied '{source_path}' to '{destination_path}'."
+        except Exception as e:
+            logger.exception("Error copying '%s' to '%s' for session '%s'.", source_path, destination_path, session_id)
+            raise ToolError(f"Error copying '{source_path}': {e}")
 
 
 def ftp_cwd(session_id: str, directory: str) -> str:
@@ -354,15 +1247,16 @@ def ftp_cwd(session_id: str, directory: str) -> str:
     :param directory: The path to the new directory.
     :return: A success message.
     """
-    ftp = _check_session(session_id)
-    try:
-        ftp.cwd(directory)
-        new_cwd = ftp.pwd()
-        logger.info(f"Changed directory to '{new_cwd}' for session '{session_id}'.")
-        return f"Successfully changed directory to '{new_cwd}'."
-    except Exception as e:
-        logger.exception(f"Error changing directory to '{directory}' for session '{session_id}'.")
-        raise ToolError(f"Error changing directory: {e}")
+    with _use_session(session_id) as session:
+        ftp = session.ftp
+        try:
+            ftp.cwd(directory)
+            new_cwd = ftp.pwd()
+            logger.info("Changed directory to '%s' for session '%s'.", new_cwd, session_id)
+            return f"Successfully changed directory to '{new_cwd}'."
+        except Exception as e:
+            logger.exception("Error changing directory to '%s' for session '%s'.", directory, session_id)
+            raise ToolError(f"Error changing directory: {e}")
 
 
 def ftp_pwd(session_id: str) -> str:
@@ -372,14 +1266,15 @@ def ftp_pwd(session_id: str) -> str:
     :param session_id: The unique ID of the active session.
     :return: Aa success message containing the current directory name.
     """
-    ftp = _check_session(session_id)
-    try:
-        current_dir = ftp.pwd()
-        logger.info(f"PWD: Current directory for session '{session_id}' is '{current_dir}'.")
-        return f"Current directory: {current_dir}"
-    except Exception as e:
-        logger.exception(f"Error getting current directory for session '{session_id}'.")
-        raise ToolError(f"Error getting current directory: {e}")
+    with _use_session(session_id) as session:
+        ftp = session.ftp
+        try:
+            current_dir = ftp.pwd()
+            logger.info("PWD: Current directory for session '%s' is '%s'.", session_id, current_dir)
+            return f"Current directory: {current_dir}"
+        except Exception as e:
+            logger.exception("Error getting current directory for session '%s'.", session_id)
+            raise ToolError(f"Error getting current directory: {e}")
 
 
 def ftp_mkdir(session_id: str, directory_name: str) -> str:
@@ -390,14 +1285,15 @@ def ftp_mkdir(session_id: str, directory_name: str) -> str:
     :param directory_name: The name of the new directory to create.
     :return: A success message.
     """
-    ftp = _check_session(session_id)
-    try:
-        ftp.mkd(directory_name)
-        logger.info(f"Created directory '{directory_name}' for session '{session_id}'.")
-        return f"Successfully created directory '{directory_name}'."
-    except Exception as e:
-        logger.exception(f"Error creating directory '{directory_name}' for session '{session_id}'.")
-        raise ToolError(f"Error creating directory: {e}")
+    with _use_session(session_id) as session:
+        ftp = session.ftp
+        try:
+            ftp.mkd(directory_name)
+            logger.info("Created directory '%s' for session '%s'.", directory_name, session_id)
+            return f"Successfully created directory '{directory_name}'."
+        except Exception as e:
+            logger.exception("Error creating directory '%s' for session '%s'.", directory_name, session_id)
+            raise ToolError(f"Error creating directory: {e}")
     
 
 def ftp_rmdir(session_id: str, directory_name: str) -> str:
@@ -408,14 +1304,15 @@ def ftp_rmdir(session_id: str, directory_name: str) -> str:
     :param directory_name: The name of the directory to remove.
     :return: A success message.
     """
-    ftp = _check_session(session_id)
-    try:
-        ftp.rmd(directory_name)
-        logger.info(f"Removed directory '{directory_name}' for session '{session_id}'.")
-        return f"Successfully removed directory '{directory_name}'."
-    except Exception as e:
-        logger.exception(f"Error removing directory '{directory_name}' for session '{session_id}'.")
-        raise ToolError(f"Error removing directory: {e}")
+    with _use_session(session_id) as session:
+        ftp = session.ftp
+        try:
+            ftp.rmd(directory_name)
+            logger.info("Removed directory '%s' for session '%s'.", directory_name, session_id)
+            return f"Successfully removed directory '{directory_name}'."
+        except Exception as e:
+            logger.exception("Error removing directory '%s' for session '%s'.", directory_name, session_id)
+            raise ToolError(f"Error removing directory: {e}")
 
 
 def ftp_abort_transfer(session_id: str) -> str:
@@ -425,14 +1322,15 @@ def ftp_abort_transfer(session_id: str) -> str:
     :param session_id: The unique ID of the active session.
     :return: A success message.
     """
-    ftp = _check_session(session_id)
-    try:
-        ftp.abort()
-        logger.info(f"Aborted previous command for session '{session_id}'.")
-        return "Previous command aborted successfully."
-    except Exception as e:
-        logger.exception(f"Error aborting transfer for session '{session_id}'.")
-        raise ToolError(f"Error aborting command: {e}")
+    with _use_session(session_id) as session:
+        ftp = session.ftp
+        try:
+            ftp.abort()
+            logger.info("Aborted previous command for session '%s'.", session_id)
+            return "Previous command aborted successfully."
+        except Exception as e:
+            logger.exception("Error aborting transfer for session '%s'.", session_id)
+            raise ToolError(f"Error aborting command: {e}")
 
 
 def ftp_cdup_directory(session_id: str) -> str:
@@ -442,15 +1340,16 @@ def ftp_cdup_directory(session_id: str) -> str:
     :param session_id: The unique ID of the active session.
     :return: A success message.
     """
-    ftp = _check_session(session_id)
-    try:
-        ftp.cwd("..")
-        new_cwd = ftp.pwd()
-        logger.info(f"Moved to parent directory for session '{session_id}'. New directory: {new_cwd}")
-        return f"Successfully moved to parent directory. New directory: {new_cwd}"
-    except Exception as e:
-        logger.exception(f"Error changing to parent directory for session '{session_id}'.")
-        raise ToolError(f"Error changing to parent directory: {e}")
+    with _use_session(session_id) as session:
+        ftp = session.ftp
+        try:
+            ftp.cwd("..")
+            new_cwd = ftp.pwd()
+            logger.info("Moved to parent directory for session '%s'. New directory: %s", session_id, new_cwd)
+            return f"Successfully moved to parent directory. New directory: {new_cwd}"
+        except Exception as e:
+            logger.exception("Error changing to parent directory for session '%s'.", session_id)
+            raise ToolError(f"Error changing to parent directory: {e}")
 
 
 def ftp_get_file_size(session_id: str, file_path: str) -> str:
@@ -461,23 +1360,18 @@ def ftp_get_file_size(session_id: str, file_path: str) -> str:
     :param file_path: The path to the file.
     :return: A success message containing the size of the file in bytes.
     """
-    ftp = _check_session(session_id)
-    try:
-        # Ensure ASCII mode initially
-        ftp.voidcmd('TYPE A')  
+    with _use_session(session_id) as session:
+        ftp = session.ftp
+        try:
+            # SIZE is only reliable in binary mode, switch to it if the session isn't there already
+            ftp.set_transfer_type('I')
+            size = ftp.size(file_path)
 
-        # Set transfer type to binary for SIZE command
-        ftp.voidcmd('TYPE I')
-        size = ftp.size(file_path)
-        
-        # Restore ASCII mode after getting size
-        ftp.voidcmd('TYPE A')
-
-        logger.info(f"Size of '{file_path}' is {size} bytes.")
-        return f"File size: {size} bytes."
-    except Exception as e:
-        logger.exception(f"Error recieving file size of '{file_path}' for session '{session_id}'.")
-        raise ToolError(f"Failed to recieve file size: {e}")
+            logger.info("Size of '%s' is %s bytes.", file_path, size)
+            return f"File size: {size} bytes."
+        except Exception as e:
+            logger.exception("Error recieving file size of '%s' for session '%s'.", file_path, session_id)
+            raise ToolError(f"Failed to recieve file size: {e}")
 
 
 def ftp_send_command(session_id: str, command: str) -> str:
@@ -489,14 +1383,16 @@ def ftp_send_command(session_id: str, command: str) -> str:
     :param command: The FTP command to send (e.g., 'SYST').
     :return: The server's response.
     """
-    ftp = _check_session(session_id)
-    try:
-        response = ftp.sendcmd(command)
-        logger.info(f"Sent command '{command}'. Response: {response}")
-        return f"Raw response: {response}"
-    except Exception as e:
-        logger.exception(f"Error executing '{command}' for session '{session_id}'.")
-        raise ToolError(f"Failed to send command '{command}': {e}")
+    with _use_session(session_id) as session:
+        ftp = session.ftp
+        ftp.raw_commands_sent = True
+        try:
+            response = ftp.sendcmd(command)
+            logger.info("Sent command '%s'. Response: %s", command, response)
+            return f"Raw response: {response}"
+        except Exception as e:
+            logger.exception("Error executing '%s' for session '%s'.", command, session_id)
+            raise ToolError(f"Failed to send command '{command}': {e}")
 
 
 def ftp_void_command(session_id: str, command: str) -> str:
@@ -508,11 +1404,13 @@ def ftp_void_command(session_id: str, command: str) -> str:
     :param command: The FTP command to send (e.g., 'NOOP').
     :return: A success message.
     """
-    ftp = _check_session(session_id)
-    try:
-        ftp.voidcmd(command)
-        logger.info(f"Sent void command '{command}'.")
-        return f"Command '{command}' sent successfully."
-    except Exception as e:
-        logger.exception(f"Error executing '{command}' for session '{session_id}'.")
-        raise ToolError(f"Failed to send void command '{command}': {e}")    
+    with _use_session(session_id) as session:
+        ftp = session.ftp
+        ftp.raw_commands_sent = True
+        try:
+            ftp.voidcmd(command)
+            logger.info("Sent void command '%s'.", command)
+            return f"Command '{command}' sent successfully."
+        except Exception as e:
+            logger.exception("Error executing '%s' for session '%s'.", command, session_id)
+            raise ToolError(f"Failed to send void command '{command}': {e}")    
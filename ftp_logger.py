@@ -1,21 +1,85 @@
+import atexit
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Queues records as they are. The stock QueueHandler formats every message and traceback in the
+    thread that logged it; the queue never leaves the process, so that is left to the listener thread.
+    The arguments of a log call must not be mutated after it.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class BufferedFileHandler(logging.FileHandler):
+    """
+    A FileHandler which writes through a large buffer instead of flushing after every record.
+    The buffer is flushed by FlushingQueueListener once there is nothing left to log, and on close.
+    """
+    def _open(self):
+        return open(self.baseFilename, self.mode, buffering=LOG_BUFFER_SIZE, encoding=self.encoding, errors=self.errors)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
+class FlushingQueueListener(QueueListener):
+    """
+    A QueueListener which flushes its handlers whenever the queue runs empty,
+    so a burst of records is written out in a few large writes.
+    """
+    def dequeue(self, block: bool) -> logging.LogRecord:
+        if block and self.queue.empty():
+            for handler in self.handlers:
+                handler.flush()
+        return super().dequeue(block)
+
+
 # Create a custom logger
 LOGGER_NAME = "MCP_FTP_Client_Logic"
 logger = logging.getLogger(LOGGER_NAME)
 logger.setLevel(logging.INFO)
 
-# Create a formatter for the log messages
-formatter = logging.Formatter("[%(asctime)s] %(name)s: %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+# Records are written by the handlers of configure_logging only, not a second time by the root logger's handlers
+logger.propagate = False
 
-# Create a handler to write logs to a file
+# The file configure_logging writes the logs to
 LOG_FILE_PATH = Path("mcp_ftp_client.log")
-file_handler = logging.FileHandler(LOG_FILE_PATH.absolute())
-file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
-
-# Create a handler to print logs to the console
-stream_handler = logging.StreamHandler()
-stream_handler.setFormatter(formatter)
-logger.addHandler(stream_handler)
\ No newline at end of file
+# Size of the write buffer of the log file
+LOG_BUFFER_SIZE = 64 * 1024
+
+
+def configure_logging() -> None:
+    """
+    Installs the handlers of the logger, which write to a file and to the console.
+    Importing the modules that log doesn't install anything, the entry point calls this once.
+    Calling it again has no effect.
+    """
+    if logger.handlers:
+        return
+
+    # Create a formatter for the log messages
+    formatter = logging.Formatter("[%(asctime)s] %(name)s: %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+
+    # Create a handler to write logs to a file
+    file_handler = BufferedFileHandler(LOG_FILE_PATH.absolute())
+    file_handler.setFormatter(formatter)
+
+    # Create a handler to print logs to the console
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    # Hand the records to a background thread which writes them, so a slow disk or console
+    # doesn't hold up the tool call that logged them
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    listener = FlushingQueueListener(log_queue, file_handler, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)
\ No newline at end of file
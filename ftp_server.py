@@ -1,7 +1,14 @@
 from pyftpdlib.authorizers import DummyAuthorizer
 from pyftpdlib.handlers import FTPHandler
-from pyftpdlib.servers import FTPServer
-
+try:
+    # Serves every connection in its own process, so concurrent clients aren't limited to one core (POSIX only)
+    from pyftpdlib.servers import MultiprocessFTPServer as FTPServer
+except ImportError:
+    from pyftpdlib.servers import ThreadedFTPServer as FTPServer
+
+import os
+import signal
+import sys
 from pathlib import Path
 from ipaddress import IPv4Address
 
@@ -9,8 +16,9 @@ from ipaddress import IPv4Address
 SERVER_IP = IPv4Address("0.0.0.0")
 SERVER_PORT = 2121
 FTP_HOME_DIR = Path(__file__).parent / "ftp_home"
-USERNAME1 = "user"
-PASSWORD1 = "12345"
+# The credentials can be overridden, so real ones don't have to live in the source
+USERNAME1 = os.environ.get("FTP_USER", "user")
+PASSWORD1 = os.environ.get("FTP_PASS", "12345")
 FULL_PERMS = "elradfmw"
 ANONYMOUS_PERMS = "elr"
 
@@ -23,7 +31,7 @@ def main():
     FTP_HOME_DIR.mkdir(exist_ok=True)
 
     # Define a new user having full permissions on the CWD & anonymous user
-    authorizer.add_user("user", "12345", str(FTP_HOME_DIR), perm=FULL_PERMS)
+    authorizer.add_user(USERNAME1, PASSWORD1, str(FTP_HOME_DIR), perm=FULL_PERMS)
     authorizer.add_anonymous(str(FTP_HOME_DIR), perm=ANONYMOUS_PERMS)
 
     # Instantiate FTP handler class
@@ -36,7 +44,8 @@ def main():
     handler.masquerade_address = '0.0.0.0'
     # Specify the range of ports to use for passive connections
     # These ports must be open in your firewall
-    handler.passive_ports = range(60000, 65535) # Example range
+    # pyftpdlib copies the whole range on every PASV to pick a free port from it, so keep it short
+    handler.passive_ports = range(60000, 61000) # Example range
 
     # Define a new server address and port
     address = (str(SERVER_IP), SERVER_PORT)
@@ -44,6 +53,9 @@ def main():
     # Instantiate FTP server class and listen on the given address
     server = FTPServer(address, handler)
 
+    # Stop on SIGTERM the way it stops on Ctrl+C, which also shuts down the worker processes
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
     # Start ftp server. This will run forever, listening for multiple connections.
     server.serve_forever()
 
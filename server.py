@@ -1,47 +1,83 @@
 import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from fastmcp import FastMCP
 from fastmcp.exceptions import ToolError
 
 from ftp_client_logic import (ftp_connect, ftp_disconnect, ftp_list, ftp_nlst, ftp_mlsd, ftp_retrieve_file,
                               ftp_store_file, ftp_store_file_unique, ftp_cwd, ftp_rename, ftp_mkdir,
-                              ftp_rmdir, ftp_abort_transfer, ftp_cdup_directory,
+                              ftp_rmdir, ftp_abort_transfer, ftp_cdup_directory, ftp_mlsd_tree,
                               ftp_get_file_size, ftp_send_command, ftp_void_command, ftp_delete_recursive, 
-                              ftp_copy_recursive, logger)
+                              ftp_copy_recursive, ftp_retrieve_many, ftp_delete_many, expire_idle_sessions,
+                              keep_sessions_alive, logger)
+from ftp_logger import configure_logging
 
 # Initialize the MCP server
 mcp = FastMCP("FTPClient")
 
+# Seconds between two sweeps for idle sessions
+SESSION_SWEEP_INTERVAL = 60
+
+# Threads running the blocking FTP calls of the tools, kept apart from the loop's default executor
+TOOL_WORKERS = 16
+_tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="ftp")
+
+
+def _async_tool(func):
+    """
+    Wraps a blocking FTP logic function in a coroutine that runs it on the tool executor,
+    so a slow network round-trip doesn't stall the event loop for the other sessions.
+
+    :param func: The synchronous logic function.
+    :return: An async function with the same name, signature and docstring.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_tool_executor, functools.partial(func, *args, **kwargs))
+    return wrapper
+
+
+# The logic functions exposed as MCP tools
+TOOLS = (ftp_connect, ftp_disconnect, ftp_list, ftp_nlst, ftp_mlsd, ftp_mlsd_tree, ftp_retrieve_file,
+         ftp_retrieve_many, ftp_store_file, ftp_store_file_unique, ftp_cwd, ftp_rename, ftp_mkdir, ftp_rmdir,
+         ftp_abort_transfer, ftp_cdup_directory, ftp_get_file_size, ftp_send_command, ftp_void_command,
+         ftp_delete_recursive, ftp_delete_many, ftp_copy_recursive)
+
 # Wrap the logic functions with the MCP tool decorator
-mcp.tool()(ftp_connect)
-mcp.tool()(ftp_disconnect)
-mcp.tool()(ftp_list)
-mcp.tool()(ftp_nlst)
-mcp.tool()(ftp_mlsd)
-mcp.tool()(ftp_retrieve_file)
-mcp.tool()(ftp_store_file)
-mcp.tool()(ftp_store_file_unique)
-mcp.tool()(ftp_cwd)
-mcp.tool()(ftp_rename)
-mcp.tool()(ftp_mkdir)
-mcp.tool()(ftp_rmdir)
-mcp.tool()(ftp_abort_transfer)
-mcp.tool()(ftp_cdup_directory)
-mcp.tool()(ftp_get_file_size)
-mcp.tool()(ftp_send_command)
-mcp.tool()(ftp_void_command)
-mcp.tool()(ftp_delete_recursive)
-mcp.tool()(ftp_copy_recursive)
+_register_tool = mcp.tool()
+for tool in TOOLS:
+    _register_tool(_async_tool(tool))
+
+async def _sweep_sessions_periodically():
+    """
+    Every SESSION_SWEEP_INTERVAL seconds, for as long as the server runs,
+    closes the sessions idle for too long and keeps the other idle sessions alive.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+        try:
+            await loop.run_in_executor(_tool_executor, expire_idle_sessions)
+            await loop.run_in_executor(_tool_executor, keep_sessions_alive)
+        except Exception:
+            logger.exception("Error while sweeping idle sessions")
 
 async def main():
     """
     Runs the MCP server.
     """
     logger.info("Starting MCP server with ftp client functionalities...")
+    sweep_task = asyncio.create_task(_sweep_sessions_periodically())
     
     # Start the server asynchronously
-    await mcp.run_async()
+    try:
+        await mcp.run_async()
+    finally:
+        sweep_task.cancel()
 
 if __name__ == "__main__":
+    configure_logging()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -1,538 +1,627 @@
 # pytest integration test
+import asyncio
 import pytest
 import pytest_asyncio
 
-from server import mcp
+import ftp_client_logic
+from server import mcp, TOOLS
 from fastmcp import FastMCP
 from fastmcp.client import Client
 from fastmcp.client.transports import FastMCPTransport
 from fastmcp.exceptions import ToolError
 
-@pytest_asyncio.fixture
+@pytest_asyncio.fixture(scope="session")
 async def main_mcp_client():
     async with Client(transport=mcp) as mcp_client:
         yield mcp_client
 
-@pytest.mark.asyncio
+@pytest.fixture(scope="session")
+def upload_file(tmp_path_factory: pytest.TempPathFactory) -> str:
+    """A local file for the tests to upload, written once per test session."""
+    path = tmp_path_factory.mktemp("upload") / "temp_upload.txt"
+    path.write_text("Hello world.")
+    return str(path)
+
+@pytest.fixture(scope="session")
+def overwrite_file(tmp_path_factory: pytest.TempPathFactory) -> str:
+    """A local file with different content, for the tests overwriting an uploaded file."""
+    path = tmp_path_factory.mktemp("overwrite") / "temp_overwrite.txt"
+    path.write_text("OVERWRITE")
+    return str(path)
+
+@pytest_asyncio.fixture(scope="session")
+async def ftp_session(main_mcp_client: Client[FastMCPTransport]):
+    """Connects to the FTP server once for all the tests which don't need a session of their own."""
+    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
+    session_id = connect_response.data["session_id"]
+    yield session_id
+    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
+
+@pytest_asyncio.fixture
+async def own_ftp_session(main_mcp_client: Client[FastMCPTransport]):
+    """Connects a session of its own for a test, e.g. one which changes the session's working directory."""
+    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
+    session_id = connect_response.data["session_id"]
+    yield session_id
+    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
+
+@pytest_asyncio.fixture(autouse=True)
+async def disconnect_leaked_sessions(main_mcp_client: Client[FastMCPTransport]):
+    """Disconnects the sessions a test left connected, e.g. when it failed before its own disconnect."""
+    existing_ids = set(ftp_client_logic.ftp_sessions)
+    yield
+    leaked_ids = set(ftp_client_logic.ftp_sessions) - existing_ids
+    await asyncio.gather(*(
+        main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id}, raise_on_error=False)
+        for session_id in leaked_ids
+    ))
+
 async def test_list_tools(main_mcp_client: Client[FastMCPTransport]):
     list_tools = await main_mcp_client.list_tools()
 
-    assert len(list_tools) == 19
+    assert len(list_tools) == len(TOOLS)
 
 
-@pytest.mark.asyncio
 async def test_ftp_connect_and_disconnect(main_mcp_client: Client[FastMCPTransport]):
     # Connect to the FTP server
     connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
-    assert "Successfully connected" in connect_response.data
+    assert "Successfully connected" in connect_response.data["message"]
     
     # Extract session ID from the response
-    session_id = connect_response.data.split("Your session ID is: ")[1].split(".")[0]
+    session_id = connect_response.data["session_id"]
     
     # Disconnect from the FTP server
     disconnect_response = await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
     assert "disconnected successfully" in disconnect_response.data
 
 
-@pytest.mark.asyncio
-async def test_retrieve_file_content(main_mcp_client: Client[FastMCPTransport]):
-    # Connect to the FTP server
-    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
-    session_id = connect_response.data.split("Your session ID is: ")[1].split(".")[0]
-
+async def test_retrieve_file_content(main_mcp_client: Client[FastMCPTransport], ftp_session: str):
     # Retrieve the content of demo.txt
-    file_content_response = await main_mcp_client.call_tool("ftp_retrieve_file", {"session_id": session_id, "filename": "demo.txt"})
+    file_content_response = await main_mcp_client.call_tool("ftp_retrieve_file", {"session_id": ftp_session, "filename": "demo.txt"})
     assert "Hello world." in file_content_response.data
 
-    # Disconnect from the FTP server
-    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
 
-@pytest.mark.asyncio
 async def test_ftp_connect_invalid_credentials(main_mcp_client: Client[FastMCPTransport]):
     # Attempt to connect with invalid credentials
-    with pytest.raises(ToolError) as excinfo:
+    with pytest.raises(ToolError, match="Authentication failed|Login incorrect"):
         await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "invalid", "password": "invalid"})
-    
-    assert "Authentication failed" in str(excinfo.value) or "Login incorrect" in str(excinfo.value)
 
-@pytest.mark.asyncio
-async def test_ftp_nlst(main_mcp_client: Client[FastMCPTransport]):
+async def test_ftp_nlst(main_mcp_client: Client[FastMCPTransport], ftp_session: str):
     """Tests the ftp_nlst tool (names only list)."""
-    # Connect to the FTP server
-    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
-    session_id = connect_response.data.split("Your session ID is: ")[1].split(".")[0]
-
     # Call the nlst tool
-    nlst_response = await main_mcp_client.call_tool("ftp_nlst", {"session_id": session_id, "directory": "/"})
+    nlst_response = await main_mcp_client.call_tool("ftp_nlst", {"session_id": ftp_session, "directory": "/"})
     
     # Check assertions
     assert isinstance(nlst_response.data, list)
     assert "demo.txt" in nlst_response.data, "demo.txt not found in NLST response"
 
-    # Disconnect from the FTP server
-    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
 
-@pytest.mark.asyncio
-async def test_ftp_mlsd(main_mcp_client: Client[FastMCPTransport]):
+async def test_ftp_mlsd(main_mcp_client: Client[FastMCPTransport], ftp_session: str):
     """Tests the ftp_mlsd tool (machine-readable list)."""
-    # Connect to the FTP server
-    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
-    session_id = connect_response.data.split("Your session ID is: ")[1].split(".")[0]
-
     # Call the mlsd tool
-    mlsd_response = await main_mcp_client.call_tool("ftp_mlsd", {"session_id": session_id, "directory": "/"})
+    mlsd_response = await main_mcp_client.call_tool("ftp_mlsd", {"session_id": ftp_session, "directory": "/"})
     
     # Check assertions
     assert isinstance(mlsd_response.data, list)
     assert len(mlsd_response.data) > 0
     assert "Root()" in str(mlsd_response.data[0]), "MLSD response does not contain expected Root() object"
 
-    # Disconnect from the FTP server
-    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
 
+async def test_ftp_mlsd_facts(main_mcp_client: Client[FastMCPTransport], ftp_session: str):
+    """Tests that ftp_mlsd only returns the requested facts."""
+    # Call the mlsd tool, asking for the type of every entry only
+    mlsd_response = await main_mcp_client.call_tool("ftp_mlsd", {"session_id": ftp_session, "directory": "/", "facts": ["Type"]})
 
-@pytest.mark.asyncio
-async def test_ftp_store_new_file(main_mcp_client: Client[FastMCPTransport]):
-    """Tests the ftp_store_file tool for uploading a new file."""
-    # Connect to the FTP server
-    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
-    session_id = connect_response.data.split("Your session ID is: ")[1].split(".")[0]
+    # Check assertions
+    entries = mlsd_response.structured_content["result"]
+    assert len(entries) > 0
+    for entry in entries:
+        assert entry["attributes"].keys() == {"type"}
+
+    # The server sends all of its default facts again afterwards
+    mlsd_response = await main_mcp_client.call_tool("ftp_mlsd", {"session_id": ftp_session, "directory": "/"})
+    for entry in mlsd_response.structured_content["result"]:
+        assert {"type", "size", "modify"} <= entry["attributes"].keys()
+
+
+async def test_ftp_mlsd_tree(main_mcp_client: Client[FastMCPTransport], ftp_session: str, upload_file: str):
+    """Tests the ftp_mlsd_tree tool (machine-readable list of a whole directory tree)."""
+    root_dir = f"test_mlsd_tree_dir_{ftp_session}"
+    nested_dir = f"{root_dir}/nested_dir"
+
+    # Create a directory tree
+    await main_mcp_client.call_tool("ftp_mkdir", {"session_id": ftp_session, "directory_name": root_dir})
+    await main_mcp_client.call_tool("ftp_mkdir", {"session_id": ftp_session, "directory_name": nested_dir})
+    await main_mcp_client.call_tool("ftp_store_file", {"session_id": ftp_session, "local_filepath": upload_file, "remote_filename": f"{nested_dir}/nested_file.txt"})
+
+    # Call the mlsd tree tool
+    tree_response = await main_mcp_client.call_tool("ftp_mlsd_tree", {"session_id": ftp_session, "directory": root_dir})
 
-    local_filepath = "temp_upload.txt"
-    remote_filename = "uploaded_new_file.txt"
+    # Check every directory of the tree was listed
+    tree = tree_response.structured_content
+    assert sorted(tree) == [f"/{root_dir}", f"/{nested_dir}"]
+    assert [entry["filename"] for entry in tree[f"/{root_dir}"]] == ["nested_dir"]
+    assert [entry["filename"] for entry in tree[f"/{nested_dir}"]] == ["nested_file.txt"]
+
+    # Clean up: delete the directory tree
+    await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": ftp_session, "remote_path": root_dir})
+
+
+@pytest.mark.parametrize("remote_filename", ["uploaded_new_file.txt", "uploaded new file with spaces.txt"])
+async def test_ftp_store_and_delete_file(main_mcp_client: Client[FastMCPTransport], ftp_session: str, upload_file: str,
+                                         remote_filename: str):
+    """Tests the ftp_store_file tool for uploading a new file, and the ftp_delete_recursive tool for deleting it."""
+    local_filepath = upload_file
 
     # Upload the new file
-    store_response = await main_mcp_client.call_tool("ftp_store_file", {"session_id": session_id, "local_filepath": local_filepath, "remote_filename": remote_filename})
+    store_response = await main_mcp_client.call_tool("ftp_store_file", {"session_id": ftp_session, "local_filepath": local_filepath, "remote_filename": remote_filename})
     assert f"File '{local_filepath}' uploaded successfully." in store_response.data
 
-    # Verify the file exists on the server by listing the directory
-    nlst_response = await main_mcp_client.call_tool("ftp_nlst", {"session_id": session_id, "directory": "/"})
-    assert remote_filename in nlst_response.data
-
-    # Clean up: delete the uploaded file from the server
-    await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": session_id, "remote_path": remote_filename})
+    # Verify the file exists on the server
+    size_response = await main_mcp_client.call_tool("ftp_get_file_size", {"session_id": ftp_session, "file_path": remote_filename})
+    assert "File size:" in size_response.data
 
-    # Disconnect from the FTP server
-    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
+    # Delete the file
+    delete_response = await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": ftp_session, "remote_path": remote_filename})
+    assert f"Successfully deleted '{remote_filename}'." in delete_response.data
 
 
-@pytest.mark.asyncio
-async def test_ftp_retrieve_non_existent_file(main_mcp_client: Client[FastMCPTransport]):
+async def test_ftp_retrieve_non_existent_file(main_mcp_client: Client[FastMCPTransport], ftp_session: str):
     """Tests the ftp_retrieve_file tool for a non-existent file."""
-    # Connect to the FTP server
-    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
-    session_id = connect_response.data.split("Your session ID is: ")[1].split(".")[0]
-
     # Attempt to retrieve a non-existent file
-    with pytest.raises(ToolError) as excinfo:
-        await main_mcp_client.call_tool("ftp_retrieve_file", {"session_id": session_id, "filename": "non_existent_file.txt"})
-    
-    assert "Error retrieving file content" in str(excinfo.value) or "No such file or directory" in str(excinfo.value)
+    with pytest.raises(ToolError, match="Error retrieving file content|No such file or directory"):
+        await main_mcp_client.call_tool("ftp_retrieve_file", {"session_id": ftp_session, "filename": "non_existent_file.txt"})
 
-    # Disconnect from the FTP server
-    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
 
+async def test_ftp_retrieve_binary_file_to_local_path(main_mcp_client: Client[FastMCPTransport], ftp_session: str, tmp_path):
+    """Tests the ftp_retrieve_file tool saving a binary file to a local path."""
+    # Upload a binary file, larger than one block
+    upload_path = tmp_path / "upload.bin"
+    upload_path.write_bytes(bytes(range(256)) * 1024)
+    remote_filename = f"test_binary_{ftp_session}.bin"
+    await main_mcp_client.call_tool("ftp_store_file", {"session_id": ftp_session, "local_filepath": str(upload_path), "remote_filename": remote_filename})
 
-@pytest.mark.asyncio
-async def test_ftp_retrieve_existing_file(main_mcp_client: Client[FastMCPTransport]):
-    """Tests the ftp_retrieve_file tool for an existing file."""
-    # Connect to the FTP server
-    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
-    session_id = connect_response.data.split("Your session ID is: ")[1].split(".")[0]
+    # Retrieve it to a local file
+    download_path = tmp_path / "download.bin"
+    retrieve_response = await main_mcp_client.call_tool("ftp_retrieve_file", {"session_id": ftp_session, "filename": remote_filename, "local_filepath": str(download_path)})
+    assert f"File '{remote_filename}' saved to '{download_path}'." in retrieve_response.data
+    assert download_path.read_bytes() == upload_path.read_bytes()
 
-    # Retrieve the content of demo.txt
-    file_content_response = await main_mcp_client.call_tool("ftp_retrieve_file", {"session_id": session_id, "filename": "demo.txt"})
-    assert "Hello world." in file_content_response.data
+    # Clean up: delete the remote file
+    await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": ftp_session, "remote_path": remote_filename})
 
-    # Disconnect from the FTP server
-    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
 
-@pytest.mark.asyncio
-async def test_ftp_store_overwrite_file(main_mcp_client: Client[FastMCPTransport]):
-    """Tests the ftp_store_file tool for overwriting an existing file."""
-    # Connect to the FTP server
-    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
-    session_id = connect_response.data.split("Your session ID is: ")[1].split(".")[0]
+async def test_ftp_retrieve_failure_keeps_local_file(main_mcp_client: Client[FastMCPTransport], ftp_session: str, tmp_path):
+    """Tests that a failed download to a local path leaves the existing local file untouched."""
+    local_path = tmp_path / "existing.txt"
+    local_path.write_text("Local content.")
 
-    local_filepath = "temp_overwrite.txt"
-    remote_filename = "demo.txt"
+    # Attempt to retrieve a non-existent file over it
+    with pytest.raises(ToolError, match="Error retrieving file content"):
+        await main_mcp_client.call_tool("ftp_retrieve_file", {"session_id": ftp_session, "filename": "non_existent_file.txt", "local_filepath": str(local_path)})
 
-    # Get original content of demo.txt to restore later
-    original_content_response = await main_mcp_client.call_tool("ftp_retrieve_file", {"session_id": session_id, "filename": remote_filename})
+    # The local file is unchanged, and no partial download is left behind
+    assert local_path.read_text() == "Local content."
+    assert list(tmp_path.iterdir()) == [local_path]
+
+
+async def test_ftp_store_overwrite_file(main_mcp_client: Client[FastMCPTransport], ftp_session: str, upload_file: str, overwrite_file: str):
+    """Tests the ftp_store_file tool for overwriting an existing file."""
+    local_filepath = overwrite_file
+    # A file of the test's own, so demo.txt stays untouched for the other tests
+    remote_filename = f"test_overwrite_{ftp_session}.txt"
+
+    # Upload the file to overwrite
+    await main_mcp_client.call_tool("ftp_store_file", {"session_id": ftp_session, "local_filepath": upload_file, "remote_filename": remote_filename})
+    original_content_response = await main_mcp_client.call_tool("ftp_retrieve_file", {"session_id": ftp_session, "filename": remote_filename})
     original_content = original_content_response.data
 
-    # Upload the new file to overwrite demo.txt
-    store_response = await main_mcp_client.call_tool("ftp_store_file", {"session_id": session_id, "local_filepath": local_filepath, "remote_filename": remote_filename})
+    # Upload the new file to overwrite it
+    store_response = await main_mcp_client.call_tool("ftp_store_file", {"session_id": ftp_session, "local_filepath": local_filepath, "remote_filename": remote_filename})
     assert f"File '{local_filepath}' uploaded successfully." in store_response.data
 
-    # Verify the content of demo.txt has changed
-    new_content_response = await main_mcp_client.call_tool("ftp_retrieve_file", {"session_id": session_id, "filename": remote_filename})
+    # Verify the content of the file has changed
+    new_content_response = await main_mcp_client.call_tool("ftp_retrieve_file", {"session_id": ftp_session, "filename": remote_filename})
     assert "OVERWRITE" in new_content_response.data
     assert original_content != new_content_response.data
 
-    # Restore original content of demo.txt
-    with open("temp_upload.txt", "w") as f:
-        f.write(original_content)
-    await main_mcp_client.call_tool("ftp_store_file", {"session_id": session_id, "local_filepath": "temp_upload.txt", "remote_filename": remote_filename})
+    # Clean up: delete the file
+    await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": ftp_session, "remote_path": remote_filename})
 
-    # Disconnect from the FTP server
-    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
 
-    # Disconnect from the FTP server
-    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
-
-
-@pytest.mark.asyncio
-async def test_ftp_store_file_unique(main_mcp_client: Client[FastMCPTransport]):
+async def test_ftp_store_file_unique(main_mcp_client: Client[FastMCPTransport], ftp_session: str, upload_file: str):
     """Tests the ftp_store_file_unique tool for uploading a file with a unique name."""
-    # Connect to the FTP server
-    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
-    session_id = connect_response.data.split("Your session ID is: ")[1].split(".")[0]
-
-    local_filepath = "temp_upload.txt"
+    local_filepath = upload_file
 
     # Upload the file with a unique name
-    store_unique_response = await main_mcp_client.call_tool("ftp_store_file_unique", {"session_id": session_id, "local_filepath": local_filepath})
+    store_unique_response = await main_mcp_client.call_tool("ftp_store_file_unique", {"session_id": ftp_session, "local_filepath": local_filepath})
     assert "File uploaded successfully with unique name:" in store_unique_response.data
     
     unique_filename = store_unique_response.data.split(": ")[1]
 
-    # Verify the file exists on the server by listing the directory
-    nlst_response = await main_mcp_client.call_tool("ftp_nlst", {"session_id": session_id, "directory": "/"})
-    assert unique_filename in nlst_response.data
+    # Verify the file exists on the server
+    size_response = await main_mcp_client.call_tool("ftp_get_file_size", {"session_id": ftp_session, "file_path": unique_filename})
+    assert "File size:" in size_response.data
 
     # Clean up: delete the uploaded file from the server
-    await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": session_id, "remote_path": unique_filename})
+    await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": ftp_session, "remote_path": unique_filename})
 
-    # Disconnect from the FTP server
-    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
 
+async def test_ftp_store_file_unreadable_local_file(main_mcp_client: Client[FastMCPTransport], ftp_session: str, tmp_path):
+    """Tests the ftp_store_file tool with local paths which can't be uploaded."""
+    # A missing file
+    with pytest.raises(ToolError, match="Local file not found"):
+        await main_mcp_client.call_tool("ftp_store_file", {"session_id": ftp_session, "local_filepath": str(tmp_path / "non_existent_file.txt")})
 
-@pytest.mark.asyncio
-async def test_ftp_mkdir(main_mcp_client: Client[FastMCPTransport]):
-    """Tests the ftp_mkdir tool for creating a new directory."""
-    # Connect to the FTP server
-    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
-    session_id = connect_response.data.split("Your session ID is: ")[1].split(".")[0]
+    # A directory
+    with pytest.raises(ToolError, match="Error uploading file"):
+        await main_mcp_client.call_tool("ftp_store_file", {"session_id": ftp_session, "local_filepath": str(tmp_path)})
 
+
+async def test_ftp_mkdir(main_mcp_client: Client[FastMCPTransport], ftp_session: str):
+    """Tests the ftp_mkdir tool for creating a new directory."""
     directory_name = "test_mkdir_dir"
 
     # Cleanup before test: ensure the directory does not exist
-    try:
-        await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": session_id, "remote_path": directory_name})
-    except ToolError:
-        pass  # Directory does not exist, which is fine
+    existing = (await main_mcp_client.call_tool("ftp_nlst", {"session_id": ftp_session, "directory": "/"})).data
+    if directory_name in existing:
+        await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": ftp_session, "remote_path": directory_name})
 
     # Create the new directory
-    mkdir_response = await main_mcp_client.call_tool("ftp_mkdir", {"session_id": session_id, "directory_name": directory_name})
+    mkdir_response = await main_mcp_client.call_tool("ftp_mkdir", {"session_id": ftp_session, "directory_name": directory_name})
     assert f"Successfully created directory '{directory_name}'." in mkdir_response.data
 
-    # Verify the directory exists on the server by listing the directory
-    nlst_response = await main_mcp_client.call_tool("ftp_nlst", {"session_id": session_id, "directory": "/"})
-    assert directory_name in nlst_response.data
-
     # Clean up: delete the created directory from the server
-    await main_mcp_client.call_tool("ftp_rmdir", {"session_id": session_id, "directory_name": directory_name})
+    await main_mcp_client.call_tool("ftp_rmdir", {"session_id": ftp_session, "directory_name": directory_name})
 
-    # Disconnect from the FTP server
-    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
 
-
-@pytest.mark.asyncio
-async def test_ftp_cwd(main_mcp_client: Client[FastMCPTransport]):
+async def test_ftp_cwd(main_mcp_client: Client[FastMCPTransport], own_ftp_session: str):
     """Tests the ftp_cwd tool for changing the current working directory."""
-    # Connect to the FTP server
-    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
-    session_id = connect_response.data.split("Your session ID is: ")[1].split(".")[0]
-
     directory_name = "test_cwd_dir"
 
     # Change the current working directory
-    cwd_response = await main_mcp_client.call_tool("ftp_cwd", {"session_id": session_id, "directory": directory_name})
+    cwd_response = await main_mcp_client.call_tool("ftp_cwd", {"session_id": own_ftp_session, "directory": directory_name})
     assert f"Successfully changed directory to '/{directory_name}'" in cwd_response.data
 
-    # Disconnect from the FTP server
-    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
-
 
-@pytest.mark.asyncio
-async def test_ftp_cdup_directory(main_mcp_client: Client[FastMCPTransport]):
+async def test_ftp_cdup_directory(main_mcp_client: Client[FastMCPTransport], own_ftp_session: str):
     """Tests the ftp_cdup_directory tool for changing to the parent directory."""
-    # Connect to the FTP server
-    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
-    session_id = connect_response.data.split("Your session ID is: ")[1].split(".")[0]
-
     directory_name = "test_cdup_dir"
 
     # Create a directory to change into
-    await main_mcp_client.call_tool("ftp_mkdir", {"session_id": session_id, "directory_name": directory_name})
+    await main_mcp_client.call_tool("ftp_mkdir", {"session_id": own_ftp_session, "directory_name": directory_name})
 
     # Change into the directory
-    await main_mcp_client.call_tool("ftp_cwd", {"session_id": session_id, "directory": directory_name})
+    await main_mcp_client.call_tool("ftp_cwd", {"session_id": own_ftp_session, "directory": directory_name})
 
     # Change to the parent directory
-    cdup_response = await main_mcp_client.call_tool("ftp_cdup_directory", {"session_id": session_id})
+    cdup_response = await main_mcp_client.call_tool("ftp_cdup_directory", {"session_id": own_ftp_session})
     assert "Successfully moved to parent directory." in cdup_response.data
 
     # Clean up: delete the created directory from the server
-    await main_mcp_client.call_tool("ftp_rmdir", {"session_id": session_id, "directory_name": directory_name})
+    await main_mcp_client.call_tool("ftp_rmdir", {"session_id": own_ftp_session, "directory_name": directory_name})
 
-    # Disconnect from the FTP server
-    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
 
+async def test_listing_reflects_changes(main_mcp_client: Client[FastMCPTransport], ftp_session: str, upload_file: str):
+    """Tests that a directory listing shows a change made right after the previous listing."""
+    filename = f"test_listing_{ftp_session}.txt"
+    new_filename = f"test_listing_renamed_{ftp_session}.txt"
 
-@pytest.mark.asyncio
-async def test_ftp_rmdir_empty(main_mcp_client: Client[FastMCPTransport]):
-    """Tests the ftp_rmdir tool for removing an empty directory."""
-    # Connect to the FTP server
-    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
-    session_id = connect_response.data.split("Your session ID is: ")[1].split(".")[0]
+    # List the directory, then change it in between listings
+    await main_mcp_client.call_tool("ftp_nlst", {"session_id": ftp_session, "directory": "/"})
+    await main_mcp_client.call_tool("ftp_store_file", {"session_id": ftp_session, "local_filepath": upload_file, "remote_filename": filename})
+    nlst_response = await main_mcp_client.call_tool("ftp_nlst", {"session_id": ftp_session, "directory": "/"})
+    assert filename in nlst_response.data
+
+    await main_mcp_client.call_tool("ftp_rename", {"session_id": ftp_session, "from_name": filename, "to_name": new_filename})
+    nlst_response = await main_mcp_client.call_tool("ftp_nlst", {"session_id": ftp_session, "directory": "/"})
+    assert new_filename in nlst_response.data
+    assert filename not in nlst_response.data
 
+    await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": ftp_session, "remote_path": new_filename})
+    nlst_response = await main_mcp_client.call_tool("ftp_nlst", {"session_id": ftp_session, "directory": "/"})
+    assert new_filename not in nlst_response.data
+
+
+async def test_listing_reflects_changes_from_other_session(main_mcp_client: Client[FastMCPTransport], ftp_session: str,
+                                                           own_ftp_session: str, upload_file: str):
+    """Tests that a directory listing shows a change made through another session of the same user."""
+    filename = f"test_listing_other_{own_ftp_session}.txt"
+
+    # List the directory, then change it through the other session
+    await main_mcp_client.call_tool("ftp_nlst", {"session_id": ftp_session, "directory": "/"})
+    await main_mcp_client.call_tool("ftp_store_file", {"session_id": own_ftp_session, "local_filepath": upload_file, "remote_filename": filename})
+    nlst_response = await main_mcp_client.call_tool("ftp_nlst", {"session_id": ftp_session, "directory": "/"})
+    assert filename in nlst_response.data
+
+    # Clean up: delete the file
+    await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": own_ftp_session, "remote_path": filename})
+
+
+async def test_ftp_rmdir_empty(main_mcp_client: Client[FastMCPTransport], ftp_session: str):
+    """Tests the ftp_rmdir tool for removing an empty directory."""
     directory_name = "test_rmdir_empty_dir"
 
     # Create the new directory
-    await main_mcp_client.call_tool("ftp_mkdir", {"session_id": session_id, "directory_name": directory_name})
+    await main_mcp_client.call_tool("ftp_mkdir", {"session_id": ftp_session, "directory_name": directory_name})
 
     # Remove the empty directory
-    rmdir_response = await main_mcp_client.call_tool("ftp_rmdir", {"session_id": session_id, "directory_name": directory_name})
+    rmdir_response = await main_mcp_client.call_tool("ftp_rmdir", {"session_id": ftp_session, "directory_name": directory_name})
     assert f"Successfully removed directory '{directory_name}'." in rmdir_response.data
 
-    # Verify the directory does not exist on the server by listing the directory
-    nlst_response = await main_mcp_client.call_tool("ftp_nlst", {"session_id": session_id, "directory": "/"})
-    assert directory_name not in nlst_response.data
 
-    # Disconnect from the FTP server
-    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
-
-
-@pytest.mark.asyncio
-async def test_ftp_rmdir_non_empty(main_mcp_client: Client[FastMCPTransport]):
+async def test_ftp_rmdir_non_empty(main_mcp_client: Client[FastMCPTransport], ftp_session: str, upload_file: str):
     """Tests the ftp_rmdir tool for attempting to remove a non-empty directory."""
-    # Connect to the FTP server
-    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
-    session_id = connect_response.data.split("Your session ID is: ")[1].split(".")[0]
-
     directory_name = "test_rmdir_non_empty_dir"
 
     # Create the new directory
-    await main_mcp_client.call_tool("ftp_mkdir", {"session_id": session_id, "directory_name": directory_name})
+    await main_mcp_client.call_tool("ftp_mkdir", {"session_id": ftp_session, "directory_name": directory_name})
 
     # Upload a file to the directory to make it non-empty
-    await main_mcp_client.call_tool("ftp_store_file", {"session_id": session_id, "local_filepath": "temp_upload.txt", "remote_filename": f"{directory_name}/uploaded_file.txt"})
+    await main_mcp_client.call_tool("ftp_store_file", {"session_id": ftp_session, "local_filepath": upload_file, "remote_filename": f"{directory_name}/uploaded_file.txt"})
 
     # Attempt to remove the non-empty directory
     with pytest.raises(ToolError) as excinfo:
-        await main_mcp_client.call_tool("ftp_rmdir", {"session_id": session_id, "directory_name": directory_name})
+        await main_mcp_client.call_tool("ftp_rmdir", {"session_id": ftp_session, "directory_name": directory_name})
     assert "550" in str(excinfo.value)  # FTP error code for directory not empty
 
     # Clean up: delete the file and the directory
-    await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": session_id, "remote_path": directory_name})
-
-    # Disconnect from the FTP server
-    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
+    await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": ftp_session, "remote_path": directory_name})
 
 
-@pytest.mark.asyncio
-async def test_ftp_rename_file(main_mcp_client: Client[FastMCPTransport]):
+async def test_ftp_rename_file(main_mcp_client: Client[FastMCPTransport], ftp_session: str, upload_file: str):
     """Tests the ftp_rename tool for renaming a file."""
-    # Connect to the FTP server
-    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
-    session_id = connect_response.data.split("Your session ID is: ")[1].split(".")[0]
-
-    original_filename = "demo.txt"
-    new_filename = "renamed_demo.txt"
+    # A file of the test's own, so demo.txt stays in place for the other tests
+    original_filename = f"test_rename_{ftp_session}.txt"
+    new_filename = f"renamed_{ftp_session}.txt"
+    await main_mcp_client.call_tool("ftp_store_file", {"session_id": ftp_session, "local_filepath": upload_file, "remote_filename": original_filename})
 
     # Rename the file
-    rename_response = await main_mcp_client.call_tool("ftp_rename", {"session_id": session_id, "from_name": original_filename, "to_name": new_filename})
+    rename_response = await main_mcp_client.call_tool("ftp_rename", {"session_id": ftp_session, "from_name": original_filename, "to_name": new_filename})
     assert f"Successfully renamed '{original_filename}' to '{new_filename}'." in rename_response.data
 
-    # Verify the new file exists and the old file does not
-    nlst_response = await main_mcp_client.call_tool("ftp_nlst", {"session_id": session_id, "directory": "/"})
-    assert new_filename in nlst_response.data
-    assert original_filename not in nlst_response.data
-
-    # Clean up: rename the file back to its original name
-    await main_mcp_client.call_tool("ftp_rename", {"session_id": session_id, "from_name": new_filename, "to_name": original_filename})
+    # Clean up: delete the renamed file
+    await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": ftp_session, "remote_path": new_filename})
 
-    # Disconnect from the FTP server
-    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
 
-
-@pytest.mark.asyncio
-async def test_ftp_rename_directory(main_mcp_client: Client[FastMCPTransport]):
+async def test_ftp_rename_directory(main_mcp_client: Client[FastMCPTransport], ftp_session: str):
     """Tests the ftp_rename tool for renaming a directory."""
-    # Connect to the FTP server
-    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
-    session_id = connect_response.data.split("Your session ID is: ")[1].split(".")[0]
-
     original_dirname = "test_rename_dir_original"
     new_dirname = "test_rename_dir_new"
 
     # Create a directory to rename
-    await main_mcp_client.call_tool("ftp_mkdir", {"session_id": session_id, "directory_name": original_dirname})
+    await main_mcp_client.call_tool("ftp_mkdir", {"session_id": ftp_session, "directory_name": original_dirname})
 
     # Rename the directory
-    rename_response = await main_mcp_client.call_tool("ftp_rename", {"session_id": session_id, "from_name": original_dirname, "to_name": new_dirname})
+    rename_response = await main_mcp_client.call_tool("ftp_rename", {"session_id": ftp_session, "from_name": original_dirname, "to_name": new_dirname})
     assert f"Successfully renamed '{original_dirname}' to '{new_dirname}'." in rename_response.data
 
-    # Verify the new directory exists and the old directory does not
-    nlst_response = await main_mcp_client.call_tool("ftp_nlst", {"session_id": session_id, "directory": "/"})
-    assert new_dirname in nlst_response.data
-    assert original_dirname not in nlst_response.data
-
     # Clean up: delete the new directory
-    await main_mcp_client.call_tool("ftp_rmdir", {"session_id": session_id, "directory_name": new_dirname})
+    await main_mcp_client.call_tool("ftp_rmdir", {"session_id": ftp_session, "directory_name": new_dirname})
 
-    # Disconnect from the FTP server
-    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
 
-
-@pytest.mark.asyncio
-async def test_ftp_delete_recursive_file(main_mcp_client: Client[FastMCPTransport]):
-    """Tests the ftp_delete_recursive tool for deleting a file."""
-    # Connect to the FTP server
-    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
-    session_id = connect_response.data.split("Your session ID is: ")[1].split(".")[0]
-
-    filename_to_delete = "temp_file_to_delete.txt"
-
-    # Create a temporary file to delete
-    await main_mcp_client.call_tool("ftp_store_file", {"session_id": session_id, "local_filepath": "temp_upload.txt", "remote_filename": filename_to_delete})
-
-    # Verify the file exists
-    nlst_response = await main_mcp_client.call_tool("ftp_nlst", {"session_id": session_id, "directory": "/"})
-    assert filename_to_delete in nlst_response.data
-
-    # Delete the file
-    delete_response = await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": session_id, "remote_path": filename_to_delete})
-    assert f"Successfully deleted '{filename_to_delete}'." in delete_response.data
-
-    # Verify the file does not exist
-    nlst_response = await main_mcp_client.call_tool("ftp_nlst", {"session_id": session_id, "directory": "/"})
-    assert filename_to_delete not in nlst_response.data
-
-    # Disconnect from the FTP server
-    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
-
-
-@pytest.mark.asyncio
-async def test_ftp_delete_recursive_non_empty_directory(main_mcp_client: Client[FastMCPTransport]):
+async def test_ftp_delete_recursive_non_empty_directory(main_mcp_client: Client[FastMCPTransport], ftp_session: str, upload_file: str):
     """Tests the ftp_delete_recursive tool for deleting a non-empty directory."""
-    # Connect to the FTP server
-    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
-    session_id = connect_response.data.split("Your session ID is: ")[1].split(".")[0]
-
     dirname_to_delete = "test_dir_to_delete"
     nested_file = f"{dirname_to_delete}/nested_file.txt"
     nested_dir = f"{dirname_to_delete}/nested_dir"
     double_nested_file = f"{nested_dir}/double_nested_file.txt"
 
     # Create a non-empty directory structure
-    await main_mcp_client.call_tool("ftp_mkdir", {"session_id": session_id, "directory_name": dirname_to_delete})
-    await main_mcp_client.call_tool("ftp_store_file", {"session_id": session_id, "local_filepath": "temp_upload.txt", "remote_filename": nested_file})
-    await main_mcp_client.call_tool("ftp_mkdir", {"session_id": session_id, "directory_name": nested_dir})
-    await main_mcp_client.call_tool("ftp_store_file", {"session_id": session_id, "local_filepath": "temp_upload.txt", "remote_filename": double_nested_file})
+    await main_mcp_client.call_tool("ftp_mkdir", {"session_id": ftp_session, "directory_name": dirname_to_delete})
+    await asyncio.gather(
+        main_mcp_client.call_tool("ftp_store_file", {"session_id": ftp_session, "local_filepath": upload_file, "remote_filename": nested_file}),
+        main_mcp_client.call_tool("ftp_mkdir", {"session_id": ftp_session, "directory_name": nested_dir}),
+    )
+    await main_mcp_client.call_tool("ftp_store_file", {"session_id": ftp_session, "local_filepath": upload_file, "remote_filename": double_nested_file})
 
     # Verify the directory and its contents exist
-    nlst_response_root = await main_mcp_client.call_tool("ftp_nlst", {"session_id": session_id, "directory": "/"})
+    nlst_response_root, nlst_response_nested, nlst_response_double_nested = await asyncio.gather(
+        main_mcp_client.call_tool("ftp_nlst", {"session_id": ftp_session, "directory": "/"}),
+        main_mcp_client.call_tool("ftp_nlst", {"session_id": ftp_session, "directory": dirname_to_delete}),
+        main_mcp_client.call_tool("ftp_nlst", {"session_id": ftp_session, "directory": nested_dir}),
+    )
     assert dirname_to_delete in nlst_response_root.data
-    nlst_response_nested = await main_mcp_client.call_tool("ftp_nlst", {"session_id": session_id, "directory": dirname_to_delete})
     assert "nested_file.txt" in nlst_response_nested.data
     assert "nested_dir" in nlst_response_nested.data
-    nlst_response_double_nested = await main_mcp_client.call_tool("ftp_nlst", {"session_id": session_id, "directory": nested_dir})
     assert "double_nested_file.txt" in nlst_response_double_nested.data
 
     # Delete the non-empty directory recursively
-    delete_response = await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": session_id, "remote_path": dirname_to_delete})
+    delete_response = await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": ftp_session, "remote_path": dirname_to_delete})
     assert f"Successfully deleted '{dirname_to_delete}'." in delete_response.data
 
     # Verify the directory and its contents do not exist
-    nlst_response_root_after_delete = await main_mcp_client.call_tool("ftp_nlst", {"session_id": session_id, "directory": "/"})
+    nlst_response_root_after_delete = await main_mcp_client.call_tool("ftp_nlst", {"session_id": ftp_session, "directory": "/"})
     assert dirname_to_delete not in nlst_response_root_after_delete.data
 
-    # Disconnect from the FTP server
-    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
 
+async def test_ftp_retrieve_and_delete_many(main_mcp_client: Client[FastMCPTransport], ftp_session: str, upload_file: str):
+    """Tests the ftp_retrieve_many and ftp_delete_many tools."""
+    filenames = [f"test_many_{i}_{ftp_session}.txt" for i in range(5)]
+    with open(upload_file) as f:
+        expected_content = f.read()
 
-@pytest.mark.asyncio
-async def test_ftp_copy_recursive_file(main_mcp_client: Client[FastMCPTransport]):
-    """Tests the ftp_copy_recursive tool for copying a file."""
-    # Connect to the FTP server
-    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
-    session_id = connect_response.data.split("Your session ID is: ")[1].split(".")[0]
+    # Upload the files
+    for filename in filenames:
+        await main_mcp_client.call_tool("ftp_store_file", {"session_id": ftp_session, "local_filepath": upload_file, "remote_filename": filename})
+
+    # Retrieve them all at once
+    retrieve_response = await main_mcp_client.call_tool("ftp_retrieve_many", {"session_id": ftp_session, "filenames": filenames})
+    assert retrieve_response.structured_content == {filename: expected_content for filename in filenames}
+
+    # Delete them all at once
+    delete_response = await main_mcp_client.call_tool("ftp_delete_many", {"session_id": ftp_session, "filenames": filenames})
+    assert "Successfully deleted 5 files." in delete_response.data
+
+    # Verify the files do not exist anymore
+    nlst_response = await main_mcp_client.call_tool("ftp_nlst", {"session_id": ftp_session, "directory": "/"})
+    assert not set(filenames) & set(nlst_response.data)
+
+
+async def test_ftp_delete_many_rejects_line_breaks(main_mcp_client: Client[FastMCPTransport], ftp_session: str, upload_file: str):
+    """Tests that ftp_delete_many doesn't let a path with a line break smuggle in another command."""
+    victim_filename = f"test_victim_{ftp_session}.txt"
+    await main_mcp_client.call_tool("ftp_store_file", {"session_id": ftp_session, "local_filepath": upload_file, "remote_filename": victim_filename})
+
+    # Attempt to delete the file through a second command hidden in a path
+    with pytest.raises(ToolError, match="illegal newline"):
+        await main_mcp_client.call_tool("ftp_delete_many", {"session_id": ftp_session, "filenames": [f"non_existent_file.txt\r\nDELE {victim_filename}"]})
+
+    # The file is still there, and the control connection is still in sync
+    size_response = await main_mcp_client.call_tool("ftp_get_file_size", {"session_id": ftp_session, "file_path": victim_filename})
+    assert "File size:" in size_response.data
+    pwd_response = await main_mcp_client.call_tool("ftp_send_command", {"session_id": ftp_session, "command": "PWD"})
+    assert pwd_response.data.startswith("Raw response: 257")
+
+    # Clean up: delete the file
+    await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": ftp_session, "remote_path": victim_filename})
+
+
+async def test_raw_cwd_updates_working_directory(main_mcp_client: Client[FastMCPTransport], own_ftp_session: str, upload_file: str):
+    """Tests that a directory change sent as a raw command is seen by tools resolving relative paths."""
+    dirname = f"test_raw_cwd_dir_{own_ftp_session}"
+    with open(upload_file) as f:
+        expected_content = f.read()
 
+    # Create a directory with a file, and resolve a relative path from the root once
+    await main_mcp_client.call_tool("ftp_mkdir", {"session_id": own_ftp_session, "directory_name": dirname})
+    await main_mcp_client.call_tool("ftp_store_file", {"session_id": own_ftp_session, "local_filepath": upload_file, "remote_filename": f"{dirname}/file.txt"})
+    await main_mcp_client.call_tool("ftp_mlsd_tree", {"session_id": own_ftp_session, "directory": "."})
+
+    # Change into the directory behind the tools' back
+    await main_mcp_client.call_tool("ftp_send_command", {"session_id": own_ftp_session, "command": f"CWD {dirname}"})
+
+    # The relative path is resolved against the new directory
+    retrieve_response = await main_mcp_client.call_tool("ftp_retrieve_many", {"session_id": own_ftp_session, "filenames": ["file.txt"]})
+    assert retrieve_response.structured_content == {"file.txt": expected_content}
+
+    # Clean up: delete the directory
+    await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": own_ftp_session, "remote_path": f"/{dirname}"})
+
+
+async def test_ftp_delete_recursive_many_files(main_mcp_client: Client[FastMCPTransport], ftp_session: str, upload_file: str):
+    """Tests the ftp_delete_recursive tool for deleting a directory with more files than fit in one pipelined batch."""
+    dirname_to_delete = f"test_dir_many_files_{ftp_session}"
+
+    # Create a directory with many files
+    await main_mcp_client.call_tool("ftp_mkdir", {"session_id": ftp_session, "directory_name": dirname_to_delete})
+    for i in range(40):
+        await main_mcp_client.call_tool("ftp_store_file", {"session_id": ftp_session, "local_filepath": upload_file, "remote_filename": f"{dirname_to_delete}/file_{i}.txt"})
+
+    # Delete the directory recursively
+    delete_response = await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": ftp_session, "remote_path": dirname_to_delete})
+    assert f"Successfully deleted '{dirname_to_delete}'." in delete_response.data
+
+    # Verify the directory does not exist and the session is still usable
+    nlst_response = await main_mcp_client.call_tool("ftp_nlst", {"session_id": ftp_session, "directory": "/"})
+    assert dirname_to_delete not in nlst_response.data
+
+
+async def test_ftp_copy_recursive_file(main_mcp_client: Client[FastMCPTransport], ftp_session: str):
+    """Tests the ftp_copy_recursive tool for copying a file."""
     source_file = "demo.txt"
     destination_file = "copied_demo.txt"
 
     # Copy the file
-    copy_response = await main_mcp_client.call_tool("ftp_copy_recursive", {"session_id": session_id, "source_path": source_file, "destination_path": destination_file})
+    copy_response = await main_mcp_client.call_tool("ftp_copy_recursive", {"session_id": ftp_session, "source_path": source_file, "destination_path": destination_file})
     assert f"Successfully copied '{source_file}' to '{destination_file}'." in copy_response.data
 
     # Verify the copied file exists
-    nlst_response = await main_mcp_client.call_tool("ftp_nlst", {"session_id": session_id, "directory": "/"})
+    nlst_response = await main_mcp_client.call_tool("ftp_nlst", {"session_id": ftp_session, "directory": "/"})
     assert destination_file in nlst_response.data
 
     # Clean up: delete the copied file
-    await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": session_id, "remote_path": destination_file})
+    await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": ftp_session, "remote_path": destination_file})
 
-    # Disconnect from the FTP server
-    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
 
+async def test_ftp_copy_recursive_onto_itself(main_mcp_client: Client[FastMCPTransport], ftp_session: str, tmp_path):
+    """Tests that the ftp_copy_recursive tool refuses to copy a file onto itself, which would truncate it."""
+    upload_path = tmp_path / "upload.bin"
+    upload_path.write_bytes(bytes(range(256)) * 1024)
+    remote_filename = f"test_copy_onto_itself_{ftp_session}.bin"
+    await main_mcp_client.call_tool("ftp_store_file", {"session_id": ftp_session, "local_filepath": str(upload_path), "remote_filename": remote_filename})
 
-@pytest.mark.asyncio
-async def test_ftp_copy_recursive_directory(main_mcp_client: Client[FastMCPTransport]):
-    """Tests the ftp_copy_recursive tool for copying a directory."""
-    # Connect to the FTP server
-    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
-    session_id = connect_response.data.split("Your session ID is: ")[1].split(".")[0]
+    # Attempt to copy the file onto itself, through a path spelled differently
+    with pytest.raises(ToolError, match="same path"):
+        await main_mcp_client.call_tool("ftp_copy_recursive", {"session_id": ftp_session, "source_path": remote_filename, "destination_path": f"./{remote_filename}"})
+
+    # The file is intact
+    size_response = await main_mcp_client.call_tool("ftp_get_file_size", {"session_id": ftp_session, "file_path": remote_filename})
+    assert f"File size: {upload_path.stat().st_size} bytes." in size_response.data
+
+    # Clean up: delete the file
+    await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": ftp_session, "remote_path": remote_filename})
 
-    source_dir = f"test_copy_source_dir_{session_id}"
-    destination_dir = f"test_copy_dest_dir_{session_id}"
+
+async def test_ftp_copy_recursive_directory(main_mcp_client: Client[FastMCPTransport], ftp_session: str, upload_file: str):
+    """Tests the ftp_copy_recursive tool for copying a directory."""
+    source_dir = f"test_copy_source_dir_{ftp_session}"
+    destination_dir = f"test_copy_dest_dir_{ftp_session}"
     nested_file_in_source = f"{source_dir}/nested_file.txt"
 
     # Cleanup before test: ensure the directories do not exist
-    try:
-        await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": session_id, "remote_path": source_dir})
-    except ToolError:
-        pass
-    try:
-        await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": session_id, "remote_path": destination_dir})
-    except ToolError:
-        pass
+    existing = (await main_mcp_client.call_tool("ftp_nlst", {"session_id": ftp_session, "directory": "/"})).data
+    await asyncio.gather(*(
+        main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": ftp_session, "remote_path": path})
+        for path in (source_dir, destination_dir) if path in existing
+    ))
 
     # Make sure source_dir exists and has a file
-    await main_mcp_client.call_tool("ftp_mkdir", {"session_id": session_id, "directory_name": source_dir})
-    await main_mcp_client.call_tool("ftp_store_file", {"session_id": session_id, "local_filepath": "temp_upload.txt", "remote_filename": nested_file_in_source})
+    await main_mcp_client.call_tool("ftp_mkdir", {"session_id": ftp_session, "directory_name": source_dir})
+    await main_mcp_client.call_tool("ftp_store_file", {"session_id": ftp_session, "local_filepath": upload_file, "remote_filename": nested_file_in_source})
 
     # Copy the directory
-    copy_response = await main_mcp_client.call_tool("ftp_copy_recursive", {"session_id": session_id, "source_path": source_dir, "destination_path": destination_dir})
+    copy_response = await main_mcp_client.call_tool("ftp_copy_recursive", {"session_id": ftp_session, "source_path": source_dir, "destination_path": destination_dir})
     assert f"Successfully copied '{source_dir}' to '{destination_dir}'." in copy_response.data
 
     # Verify the copied directory and its contents exist
-    nlst_response_root = await main_mcp_client.call_tool("ftp_nlst", {"session_id": session_id, "directory": "/"})
+    nlst_response_root, nlst_response_destination = await asyncio.gather(
+        main_mcp_client.call_tool("ftp_nlst", {"session_id": ftp_session, "directory": "/"}),
+        main_mcp_client.call_tool("ftp_nlst", {"session_id": ftp_session, "directory": destination_dir}),
+    )
     assert destination_dir in nlst_response_root.data
-    nlst_response_destination = await main_mcp_client.call_tool("ftp_nlst", {"session_id": session_id, "directory": destination_dir})
     assert "nested_file.txt" in nlst_response_destination.data
 
     # Clean up: delete source and destination directories
-    await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": session_id, "remote_path": source_dir})
-    await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": session_id, "remote_path": destination_dir})
+    await asyncio.gather(
+        main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": ftp_session, "remote_path": source_dir}),
+        main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": ftp_session, "remote_path": destination_dir}),
+    )
 
-    # Disconnect from the FTP server
-    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
 
+async def test_ftp_copy_recursive_nested_directory(main_mcp_client: Client[FastMCPTransport], ftp_session: str, upload_file: str):
+    """Tests the ftp_copy_recursive tool for copying a directory with several files and a nested directory."""
+    source_dir = f"test_copy_nested_source_{ftp_session}"
+    destination_dir = f"test_copy_nested_dest_{ftp_session}"
+    nested_dir = "nested_dir"
+    source_files = ["file_1.txt", "file_2.txt", "file_3.txt", f"{nested_dir}/file_4.txt", f"{nested_dir}/file_5.txt"]
+
+    # Create the source tree
+    await main_mcp_client.call_tool("ftp_mkdir", {"session_id": ftp_session, "directory_name": source_dir})
+    await main_mcp_client.call_tool("ftp_mkdir", {"session_id": ftp_session, "directory_name": f"{source_dir}/{nested_dir}"})
+    for source_file in source_files:
+        await main_mcp_client.call_tool("ftp_store_file", {"session_id": ftp_session, "local_filepath": upload_file, "remote_filename": f"{source_dir}/{source_file}"})
+
+    # Copy the directory
+    copy_response = await main_mcp_client.call_tool("ftp_copy_recursive", {"session_id": ftp_session, "source_path": source_dir, "destination_path": destination_dir})
+    assert f"Successfully copied '{source_dir}' to '{destination_dir}'." in copy_response.data
+
+    # Verify every file was copied with its content
+    for source_file in source_files:
+        file_content_response = await main_mcp_client.call_tool("ftp_retrieve_file", {"session_id": ftp_session, "filename": f"{destination_dir}/{source_file}"})
+        assert "Hello world." in file_content_response.data
+
+    # Clean up: delete source and destination directories
+    await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": ftp_session, "remote_path": source_dir})
+    await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": ftp_session, "remote_path": destination_dir})
 
-@pytest.mark.asyncio
-async def test_ftp_get_file_size(main_mcp_client: Client[FastMCPTransport]):
-    """Tests the ftp_get_file_size tool for getting the size of an existing file."""
-    # Connect to the FTP server
-    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
-    session_id = connect_response.data.split("Your session ID is: ")[1].split(".")[0]
 
+async def test_ftp_get_file_size(main_mcp_client: Client[FastMCPTransport], ftp_session: str):
+    """Tests the ftp_get_file_size tool for getting the size of an existing file."""
     filename = "demo.txt"
 
     # Get the file size
-    size_response = await main_mcp_client.call_tool("ftp_get_file_size", {"session_id": session_id, "file_path": filename})
+    size_response = await main_mcp_client.call_tool("ftp_get_file_size", {"session_id": ftp_session, "file_path": filename})
     assert "File size:" in size_response.data
     assert "bytes." in size_response.data
 
@@ -540,41 +629,220 @@ async def test_ftp_get_file_size(main_mcp_client: Client[FastMCPTransport]):
     size_str = size_response.data.split(": ")[1].split(" ")[0]
     assert int(size_str) > 0
 
+
+async def test_ftp_get_file_size_after_ascii_transfer(main_mcp_client: Client[FastMCPTransport], ftp_session: str):
+    """Tests the ftp_get_file_size tool after a LIST switched the session to ASCII mode."""
+    # Get the size once, list the directory (TYPE A), and get the size again
+    first_size_response = await main_mcp_client.call_tool("ftp_get_file_size", {"session_id": ftp_session, "file_path": "demo.txt"})
+    await main_mcp_client.call_tool("ftp_list", {"session_id": ftp_session, "directory": "/"})
+    second_size_response = await main_mcp_client.call_tool("ftp_get_file_size", {"session_id": ftp_session, "file_path": "demo.txt"})
+    assert first_size_response.data == second_size_response.data
+
+
+async def test_ftp_void_command(main_mcp_client: Client[FastMCPTransport], ftp_session: str):
+    """Tests the ftp_void_command tool for sending a void command (e.g., NOOP)."""
+    command = "NOOP"
+
+    # Send a void command (NOOP should return a success message)
+    void_command_response = await main_mcp_client.call_tool("ftp_void_command", {"session_id": ftp_session, "command": command})
+    assert f"Command '{command}' sent successfully." in void_command_response.data
+
+
+async def test_ftp_abort_transfer(main_mcp_client: Client[FastMCPTransport], ftp_session: str):
+    """Tests the ftp_abort_transfer tool."""
+    # Call abort transfer (even if no transfer is in progress, it should return success or a handled error)
+    abort_response = await main_mcp_client.call_tool("ftp_abort_transfer", {"session_id": ftp_session})
+    assert "Previous command aborted successfully." in abort_response.data
+
+
+async def test_session_closed_by_server(main_mcp_client: Client[FastMCPTransport]):
+    """Tests that a session whose connection was closed by the server is removed and reported."""
+    # Connect to the FTP server
+    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
+    session_id = connect_response.data["session_id"]
+
+    # Make the server close the control connection, right after a listing which could be served from the cache
+    await main_mcp_client.call_tool("ftp_nlst", {"session_id": session_id, "directory": "/"})
+    await main_mcp_client.call_tool("ftp_send_command", {"session_id": session_id, "command": "QUIT"})
+
+    # The next command fails on the dead connection, which removes the session and asks the caller to reconnect
+    with pytest.raises(ToolError) as excinfo:
+        await main_mcp_client.call_tool("ftp_nlst", {"session_id": session_id, "directory": "/"})
+    assert "Please reconnect" in str(excinfo.value)
+
+    # The session is gone
+    with pytest.raises(ToolError) as excinfo:
+        await main_mcp_client.call_tool("ftp_nlst", {"session_id": session_id, "directory": "/"})
+    assert "not found" in str(excinfo.value)
+
+
+async def test_concurrent_calls_on_one_session(main_mcp_client: Client[FastMCPTransport], ftp_session: str):
+    """Tests that concurrent tool calls on the same session do not interleave their commands."""
+    # Fire a batch of calls at the same control connection at once
+    responses = await asyncio.gather(
+        *(main_mcp_client.call_tool("ftp_nlst", {"session_id": ftp_session, "directory": "/"}) for _ in range(10)),
+        *(main_mcp_client.call_tool("ftp_mlsd", {"session_id": ftp_session, "directory": "/"}) for _ in range(10)),
+    )
+
+    # Every call got its own, well-formed reply
+    for response in responses[:10]:
+        assert all(isinstance(name, str) for name in response.structured_content["result"])
+    for response in responses[10:]:
+        assert all("attributes" in entry for entry in response.structured_content["result"])
+
+
+async def test_idle_session_expires(main_mcp_client: Client[FastMCPTransport], ftp_session: str):
+    """Tests that sessions left unused for too long are closed and removed."""
+    # Connect to the FTP server
+    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
+    session_id = connect_response.data["session_id"]
+
+    # Make this session, and only this one, look unused for too long
+    session = ftp_client_logic.ftp_sessions[session_id]
+    session.last_used -= ftp_client_logic.SESSION_IDLE_TIMEOUT
+    ftp_client_logic.ftp_sessions.move_to_end(session_id, last=False)
+    assert ftp_client_logic.expire_idle_sessions() == 1
+
+    # The session is gone, the other sessions are still there
+    with pytest.raises(ToolError) as excinfo:
+        await main_mcp_client.call_tool("ftp_nlst", {"session_id": session_id, "directory": "/"})
+    assert "not found" in str(excinfo.value)
+    await main_mcp_client.call_tool("ftp_nlst", {"session_id": ftp_session, "directory": "/"})
+
+
+async def test_busy_session_does_not_expire(main_mcp_client: Client[FastMCPTransport]):
+    """Tests that a session busy with a call longer than the idle timeout isn't closed under it."""
+    # Connect to the FTP server
+    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
+    session_id = connect_response.data["session_id"]
+
+    # Make the session look unused for too long, while a call holds it
+    session = ftp_client_logic.ftp_sessions[session_id]
+    session.last_used -= ftp_client_logic.SESSION_IDLE_TIMEOUT
+    ftp_client_logic.ftp_sessions.move_to_end(session_id, last=False)
+    with session.lock:
+        # The sweep runs on a thread of its own, as the lock is reentrant, and mustn't wait for the call to end
+        assert await asyncio.wait_for(asyncio.to_thread(ftp_client_logic.expire_idle_sessions), timeout=5) == 0
+
+    # The session is still usable
+    nlst_response = await main_mcp_client.call_tool("ftp_nlst", {"session_id": session_id, "directory": "/"})
+    assert isinstance(nlst_response.data, list)
+
     # Disconnect from the FTP server
     await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
 
 
+async def test_idle_session_kept_alive(main_mcp_client: Client[FastMCPTransport], monkeypatch: pytest.MonkeyPatch):
+    """Tests that idle sessions are kept alive, and dead ones removed, by the keepalive sweep."""
+    # Connect two sessions to the FTP server
+    connect_responses = [
+        await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
+        for _ in range(2)
+    ]
+    alive_id, dead_id = (response.data["session_id"] for response in connect_responses)
+
+    # Make the server close the control connection of the second session
+    await main_mcp_client.call_tool("ftp_send_command", {"session_id": dead_id, "command": "QUIT"})
+
+    # Treat every session as idle
+    monkeypatch.setattr(ftp_client_logic, "KEEPALIVE_INTERVAL", 0)
+    ftp_client_logic.keep_sessions_alive()
+
+    # The live session is still usable, the dead one is gone
+    nlst_response = await main_mcp_client.call_tool("ftp_nlst", {"session_id": alive_id, "directory": "/"})
+    assert isinstance(nlst_response.structured_content["result"], list)
+    with pytest.raises(ToolError) as excinfo:
+        await main_mcp_client.call_tool("ftp_nlst", {"session_id": dead_id, "directory": "/"})
+    assert "not found" in str(excinfo.value)
+
     # Disconnect from the FTP server
-    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
+    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": alive_id})
 
 
-@pytest.mark.asyncio
-async def test_ftp_void_command(main_mcp_client: Client[FastMCPTransport]):
-    """Tests the ftp_void_command tool for sending a void command (e.g., NOOP)."""
+async def test_connect_reuses_disconnected_session(main_mcp_client: Client[FastMCPTransport]):
+    """Tests that connecting again reuses the connection of a disconnected session, reset to the login directory."""
     # Connect to the FTP server
     connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
-    session_id = connect_response.data.split("Your session ID is: ")[1].split(".")[0]
+    session_id = connect_response.data["session_id"]
 
-    command = "NOOP"
+    dirname = f"test_warm_dir_{session_id}"
 
-    # Send a void command (NOOP should return a success message)
-    void_command_response = await main_mcp_client.call_tool("ftp_void_command", {"session_id": session_id, "command": command})
-    assert f"Command '{command}' sent successfully." in void_command_response.data
+    # Leave the session in a subdirectory, then disconnect
+    await main_mcp_client.call_tool("ftp_mkdir", {"session_id": session_id, "directory_name": dirname})
+    await main_mcp_client.call_tool("ftp_cwd", {"session_id": session_id, "directory": dirname})
+    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
+    ftp_connection = ftp_client_logic._warm_sessions[-1].ftp
 
-    # Disconnect from the FTP server
+    # Wrong credentials don't get the logged-in connection
+    with pytest.raises(ToolError):
+        await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "wrong"})
+
+    # Connecting again reuses it, back in the login directory
+    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
+    session_id = connect_response.data["session_id"]
+    assert ftp_client_logic.ftp_sessions[session_id].ftp is ftp_connection
+    pwd_response = await main_mcp_client.call_tool("ftp_send_command", {"session_id": session_id, "command": "PWD"})
+    assert '"/"' in pwd_response.data
+
+    # Clean up
+    await main_mcp_client.call_tool("ftp_rmdir", {"session_id": session_id, "directory_name": dirname})
     await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
 
 
-@pytest.mark.asyncio
-async def test_ftp_abort_transfer(main_mcp_client: Client[FastMCPTransport]):
-    """Tests the ftp_abort_transfer tool."""
-    # Connect to the FTP server
+async def test_connect_skips_session_after_raw_commands(main_mcp_client: Client[FastMCPTransport], tmp_path):
+    """Tests that the server state left by raw commands doesn't leak into the next session."""
+    upload_path = tmp_path / "digits.txt"
+    upload_path.write_text("0123456789")
+
+    # Connect to the FTP server and upload a file
     connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
-    session_id = connect_response.data.split("Your session ID is: ")[1].split(".")[0]
+    session_id = connect_response.data["session_id"]
+    remote_filename = f"test_raw_state_{session_id}.txt"
+    await main_mcp_client.call_tool("ftp_store_file", {"session_id": session_id, "local_filepath": str(upload_path), "remote_filename": remote_filename})
 
-    # Call abort transfer (even if no transfer is in progress, it should return success or a handled error)
-    abort_response = await main_mcp_client.call_tool("ftp_abort_transfer", {"session_id": session_id})
-    assert "Previous command aborted successfully." in abort_response.data
+    # Leave a pending restart offset behind, then disconnect
+    await main_mcp_client.call_tool("ftp_send_command", {"session_id": session_id, "command": "TYPE I"})
+    await main_mcp_client.call_tool("ftp_send_command", {"session_id": session_id, "command": "REST 5"})
+    await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
 
-    # Disconnect from the FTP server
+    # The next session retrieves the whole file
+    connect_response = await main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
+    session_id = connect_response.data["session_id"]
+    retrieve_response = await main_mcp_client.call_tool("ftp_retrieve_file", {"session_id": session_id, "filename": remote_filename})
+    assert retrieve_response.data == "0123456789"
+
+    # Clean up
+    await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": session_id, "remote_path": remote_filename})
     await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})
+
+
+async def test_concurrent_sessions_are_isolated(main_mcp_client: Client[FastMCPTransport]):
+    """Tests that concurrent sessions keep their own state."""
+    # Connect two sessions at once
+    connect_responses = await asyncio.gather(*(
+        main_mcp_client.call_tool("ftp_connect", {"host": "127.0.0.1", "port": 2121, "username": "user", "password": "12345"})
+        for _ in range(2)
+    ))
+    first_id, second_id = (response.data["session_id"] for response in connect_responses)
+    assert first_id != second_id
+
+    dirname = f"test_isolated_dir_{first_id}"
+
+    # Move the first session into a new directory
+    await main_mcp_client.call_tool("ftp_mkdir", {"session_id": first_id, "directory_name": dirname})
+    await main_mcp_client.call_tool("ftp_cwd", {"session_id": first_id, "directory": dirname})
+
+    # Both sessions list their own working directory at the same time
+    first_nlst, second_nlst = await asyncio.gather(
+        main_mcp_client.call_tool("ftp_nlst", {"session_id": first_id, "directory": "."}),
+        main_mcp_client.call_tool("ftp_nlst", {"session_id": second_id, "directory": "."}),
+    )
+    assert first_nlst.structured_content["result"] == []
+    assert dirname in second_nlst.structured_content["result"]
+
+    # Clean up: delete the directory
+    await main_mcp_client.call_tool("ftp_delete_recursive", {"session_id": second_id, "remote_path": dirname})
+
+    # Disconnect both sessions
+    for session_id in (first_id, second_id):
+        await main_mcp_client.call_tool("ftp_disconnect", {"session_id": session_id})